@@ -0,0 +1,119 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from run import PROJECT_DIR, RESULTS_DIR, get_data_file, get_environment
+
+sys.path.insert(0, PROJECT_DIR)
+
+from database import compute_sql_analysis, export_to_sqlite, open_database
+from process import SalesDataset, load_sales_data, preprocess_data
+from shards import compute_analysis, get_analysis_name
+
+
+# Два способа считать анализы: process.py по таблице в памяти (pandas) и database.py запросами к SQLite.
+# Для pandas замеряется загрузка и очистка файла и каждый анализ на только что загруженных данных,
+# для SQLite — разовая выгрузка в базу, открытие базы и каждый анализ запросом.
+# Заодно проверяется, что таблицы обоих способов совпадают.
+# Запуск: python benchmarks/backends.py --sizes 1e4 1e5 1e6
+
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_REPEAT = 3
+TOP_N = 10
+ANALYSES = [
+    ("revenue", "D"), ("revenue", "W"), ("revenue", "M"),
+    ("profit", "D"), ("profit", "W"), ("profit", "M"),
+    ("categories", None),
+    ("top", "quantity"), ("top", "revenue"),
+    ("inventory", None)
+]
+
+
+def best_time(func, repeat):
+    # Лучшее время из repeat прогонов и результат последнего
+    seconds = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - started)
+    return min(seconds), result
+
+
+def fresh_dataset(dataset):
+    # Новый SalesDataset на тех же строках: без куба и запомненных результатов, как сразу после загрузки
+    return SalesDataset(dataset.data, {name: (part.start, part.stop) for name, part in dataset.partitions.items()})
+
+
+def tables_equal(expected, actual):
+    # Значения таблиц совпадают
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк анализов в pandas и в SQLite")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="размеры в строках, например 1e4 1e5 1e6")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="файл с результатами (JSON)")
+    args = parser.parse_args(argv)
+
+    environment = get_environment()
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in args.sizes:
+            rows = int(size)
+            path = get_data_file(rows, args.seed)
+            db_path = os.path.join(tmp_dir, f"sales_{rows}.db")
+            print(f"{rows} строк:")
+
+            load_seconds, dataset = best_time(lambda: SalesDataset(preprocess_data(load_sales_data(path))), args.repeat)
+            export_seconds, _ = best_time(lambda: export_to_sqlite(dataset, db_path), 1)
+            open_seconds, connection = best_time(lambda: open_database(db_path), args.repeat)
+            print(f"  pandas: загрузка {load_seconds:.3f} с; SQLite: выгрузка {export_seconds:.3f} с, "
+                  f"открытие {open_seconds * 1000:.2f} мс, база {os.path.getsize(db_path) / 2 ** 20:.1f} МБ "
+                  f"(CSV {os.path.getsize(path) / 2 ** 20:.1f} МБ)")
+            records.append({"size": rows, "stage": "pandas:load", "seconds": load_seconds})
+            records.append({"size": rows, "stage": "sqlite:export", "seconds": export_seconds,
+                            "database_bytes": os.path.getsize(db_path), "csv_bytes": os.path.getsize(path)})
+            records.append({"size": rows, "stage": "sqlite:open", "seconds": open_seconds})
+
+            for name, option in ANALYSES:
+                analysis = get_analysis_name(name, option)
+                pandas_seconds, expected = best_time(
+                    lambda: compute_analysis(fresh_dataset(dataset), name, option, TOP_N), args.repeat)
+                sql_seconds, actual = best_time(
+                    lambda: compute_sql_analysis(connection, name, option, TOP_N), args.repeat)
+                equal = tables_equal(expected, actual)
+                print(f"  {analysis:<14} pandas {pandas_seconds:>8.4f} с  SQLite {sql_seconds:>8.4f} с  "
+                      f"{'совпадает' if equal else 'НЕ СОВПАДАЕТ'}")
+                records.append({"size": rows, "stage": f"pandas:{analysis}", "seconds": pandas_seconds})
+                records.append({"size": rows, "stage": f"sqlite:{analysis}", "seconds": sql_seconds, "equal": equal})
+            connection.close()
+
+    output = args.output
+    if output is None:
+        commit = (environment["commit"] or "nogit")[:8]
+        output = os.path.join(RESULTS_DIR, f"backends-{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "repeat": args.repeat, "results": records}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+
+# Сравнение двух прогонов benchmarks/run.py: во сколько раз изменилось время каждого этапа.
+# С --fail-above завершается с кодом 1, если какой-то этап замедлился сильнее порога.
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        results = json.load(f)["results"]
+    return {(record["size"], record["stage"]): record for record in results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарка")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--fail-above", type=float, default=None,
+                        help="допустимое замедление, например 1.2 — не больше чем на 20%%")
+    args = parser.parse_args(argv)
+
+    old, new = load_results(args.old), load_results(args.new)
+    regressions = 0
+    print(f"{'строк':>10}  {'этап':<45} {'было, с':>10} {'стало, с':>10} {'стало/было':>11}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["seconds"], new[key]["seconds"]
+        ratio = after / before if before > 0 else float("inf")
+        mark = ""
+        if args.fail_above is not None and ratio > args.fail_above:
+            mark = "  <-- медленнее"
+            regressions += 1
+        print(f"{key[0]:>10}  {key[1]:<45} {before:>10.4f} {after:>10.4f} {ratio:>11.2f}{mark}")
+
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:>10}  {key[1]:<45} есть только в {'старом' if key in old else 'новом'} прогоне")
+
+    if regressions:
+        print(f"Замедлилось этапов: {regressions}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
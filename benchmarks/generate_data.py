@@ -0,0 +1,146 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from process import REQUIRED_COLS
+
+
+# Генератор синтетических файлов продаж в том же формате, что и Data 1.csv:
+# те же столбцы, разделитель ";", даты ДД.ММ.ГГГГ, кодировка UTF-8 с BOM,
+# операции "Поступление" и "Продажа". Файл пишется блоками, поэтому
+# размер ограничен только диском, а память не зависит от числа строк (10^4 … 10^8).
+
+# Базовый ассортимент по отделам: (название, цена за упаковку)
+BASE_CATALOG = {
+    "Молоко": [
+        ("Молоко ультрапастеризованное", 57), ("Кефир 3,2%", 75), ("Ряженка термостатная", 50),
+        ("Сливки 10%", 38), ("Сметана 15%", 55), ("Творог 9% жирности", 60),
+        ("Яйцо диетическое", 70), ("Масло сливочное крестьянское", 90)
+    ],
+    "Бакалея": [
+        ("Крупа гречневая ядрица", 95), ("Рис длиннозерный", 115), ("Макароны спагетти", 50),
+        ("Сахар песок белый", 38), ("Мука блинная", 65), ("Чай черный индийский", 180),
+        ("Кофе растворимый", 330), ("Соль поваренная Экстра", 35)
+    ],
+    "Мясная гастрономия": [
+        ("Колбаса вареная докторская", 200), ("Сервелат варенокопченый", 350), ("Сосиски молочные", 190),
+        ("Сардельки", 180), ("Колбаса сырокопченая салями", 400), ("Бекон сырокопченый", 500),
+        ("Ветчина в оболочке", 220), ("Паштет из куриной печени", 150)
+    ]
+}
+DISTRICTS = ["Октябрьский", "Заречный", "Первомайский", "Центральный", "Ленинский", "Северный"]
+STREETS = ["просп. Мира", "пл. Революции", "Луговая", "Мартеновская", "Элеваторная", "Пушкинская",
+           "ул. Металлургов", "Колхозная", "Заводская", "ул. Гагарина", "ул. Сталеваров", "Прибрежная"]
+OPERATIONS = ["Поступление", "Продажа"]
+START_DATE = "2021-06-01"
+MAX_QUANTITY = 250
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+
+def default_cardinalities(rows):
+    # Число магазинов и товаров растёт с объёмом данных, как в настоящей сети:
+    # 16 магазинов и 64 товара на маленьких файлах (как в Data 1.csv), до 2000 и 20000 на больших
+    stores = int(np.clip(rows // 5000, 16, 2000))
+    articles = int(np.clip(rows // 2000, 64, 20000))
+    return stores, articles
+
+
+def build_stores(count, rng):
+    # Адреса магазинов (уникальные) и их районы
+    streets = np.array(STREETS)[np.arange(count) % len(STREETS)]
+    houses = np.arange(count) // len(STREETS) + 1
+    addresses = np.array([f"{street}, {house}" for street, house in zip(streets, houses)], dtype=object)
+    districts = np.array(DISTRICTS, dtype=object)[rng.integers(0, len(DISTRICTS), count)]
+    return addresses, districts
+
+
+def build_catalog(count, rng):
+    # Артикулы 1..count: название, отдел и цена. Сверх базового ассортимента добавляем варианты товаров
+    base = [(name, department, price) for department, items in BASE_CATALOG.items() for name, price in items]
+    names, departments, prices = [], [], []
+    for i in range(count):
+        name, department, price = base[i % len(base)]
+        variant = i // len(base)
+        names.append(name if variant == 0 else f"{name} №{variant + 1}")
+        departments.append(department)
+        # Цена варианта немного отличается от базовой
+        prices.append(price if variant == 0 else max(10, int(price * rng.uniform(0.7, 1.3))))
+    return np.array(names, dtype=object), np.array(departments, dtype=object), np.array(prices)
+
+
+def get_article_weights(count, skew):
+    # Доли продаж товаров по закону Ципфа: товар с номером r продаётся в r^skew раз реже первого.
+    # Номера перемешаны, чтобы популярные товары были в разных отделах
+    weights = 1 / np.arange(1, count + 1) ** skew
+    return np.random.default_rng(count).permutation(weights / weights.sum())
+
+
+def generate_chunk(first_id, rows, total_rows, days, stores, catalog, rng, article_weights=None):
+    addresses, districts = stores
+    names, departments, prices = catalog
+    ids = np.arange(first_id, first_id + rows)
+    # Строки идут по датам, как в выгрузке из кассовой системы
+    day = (ids - 1) * days // total_rows
+    # Форматируем каждую дату один раз, а не для каждой строки
+    dates = pd.date_range(START_DATE, periods=days).strftime("%d.%m.%Y").to_numpy(dtype=object)[day]
+    store = rng.integers(0, len(addresses), rows)
+    if article_weights is None:
+        article = rng.integers(0, len(names), rows)
+    else:
+        article = rng.choice(len(names), rows, p=article_weights)
+    return pd.DataFrame({
+        "ID операции": ids,
+        "Дата": dates,
+        "Адрес магазина": addresses[store],
+        "Район магазина": districts[store],
+        "Артикул": article + 1,
+        "Название товара": names[article],
+        "Отдел товара": departments[article],
+        "Количество упаковок, шт.": rng.integers(0, MAX_QUANTITY + 1, rows),
+        "Операция": np.array(OPERATIONS, dtype=object)[rng.integers(0, len(OPERATIONS), rows)],
+        "Цена руб./шт.": prices[article]
+    }, columns=REQUIRED_COLS)
+
+
+def generate_sales_csv(path, rows, stores=None, articles=None, days=30, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS, skew=0.0):
+    # Записывает файл из rows строк. stores и articles по умолчанию зависят от rows.
+    # skew > 0 — товары продаются неравномерно (закон Ципфа), как в настоящем магазине; 0 — равномерно.
+    # При одинаковом seed получается один и тот же файл.
+    rng = np.random.default_rng(seed)
+    default_stores, default_articles = default_cardinalities(rows)
+    store_table = build_stores(stores or default_stores, rng)
+    catalog = build_catalog(articles or default_articles, rng)
+    article_weights = get_article_weights(len(catalog[0]), skew) if skew > 0 else None
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        for first_id in range(1, rows + 1, chunk_rows):
+            chunk = generate_chunk(first_id, min(chunk_rows, rows - first_id + 1), rows, days, store_table, catalog, rng, article_weights)
+            chunk.to_csv(f, sep=";", index=False, header=first_id == 1)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных о продажах")
+    parser.add_argument("path", help="куда записать CSV")
+    parser.add_argument("rows", type=float, help="число строк, можно 1e6")
+    parser.add_argument("--stores", type=int, default=None)
+    parser.add_argument("--articles", type=int, default=None)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=0.0, help="неравномерность продаж товаров (закон Ципфа), например 1.1")
+    args = parser.parse_args(argv)
+
+    generate_sales_csv(args.path, int(args.rows), args.stores, args.articles, args.days, args.seed, skew=args.skew)
+    print(f"Записано {int(args.rows)} строк в {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from run import PROJECT_DIR, RESULTS_DIR, get_data_file, get_environment, measure
+
+sys.path.insert(0, PROJECT_DIR)
+
+from process import get_operation_mask, get_top_n_products, load_sales_data, preprocess_data, to_rubles
+from streaming import METRIC_COLUMNS, SpaceSaving, stream_top_n_products
+
+
+# Потоковый топ-N (Space-Saving) против точного get_top_n_products на синтетических данных:
+# время и пик памяти от чтения файла до готового топа, точность потокового топа.
+# Запуск: python benchmarks/heavy_hitters.py --sizes 1e5 1e6 --capacities 100 1000 --skew 1.1
+
+DEFAULT_SIZES = [10 ** 5, 10 ** 6]
+DEFAULT_CAPACITIES = [100, 1000]
+DEFAULT_SKEW = 1.1
+DEFAULT_REPEAT = 1
+TOP_N = 10
+CHUNK_SIZE = 10_000
+
+
+def load_and_rank(path, metric):
+    # Точный путь: загрузить файл целиком, очистить и построить топ
+    return get_top_n_products(preprocess_data(load_sales_data(path)), TOP_N, metric)
+
+
+def measure_live(data, metric, capacity):
+    # Живой топ: после каждого нового куска нужен свежий топ. Потоковый топ только добавляет кусок,
+    # точному приходится заново группировать всю накопленную историю (замеряется последний, самый дорогой запрос).
+    # Возвращает среднее время запроса к потоковому топу и время точного запроса, в секундах
+    tracker = SpaceSaving(capacity, metric)
+    chunks = range(0, len(data), CHUNK_SIZE)
+    started = time.perf_counter()
+    for start in chunks:
+        tracker.update(data.iloc[start:start + CHUNK_SIZE])
+        tracker.top(TOP_N)
+    stream_seconds = (time.perf_counter() - started) / len(chunks)
+    started = time.perf_counter()
+    get_top_n_products(data, TOP_N, metric)
+    return stream_seconds, time.perf_counter() - started
+
+
+def get_true_sums(data, metric):
+    # Точные суммы по всем товарам для оценки погрешности (выручка — в рублях, как в топе)
+    sales = data[get_operation_mask(data['Операция'], ["продажа"])]
+    sums = sales.groupby('Название товара', observed=True)[METRIC_COLUMNS[metric]].sum()
+    return to_rubles(sums) if metric == "revenue" else sums
+
+
+def get_accuracy(exact, streamed, true_sums):
+    # Доля настоящего топа в потоковом, наибольшая относительная ошибка оценки
+    # и сколько товаров отмечено как гарантированно входящие в топ
+    names = streamed['Название товара']
+    estimates = streamed.iloc[:, 1].to_numpy()
+    truth = true_sums.reindex(names).to_numpy()
+    return {
+        "recall": len(set(names) & set(exact['Название товара'])) / len(exact),
+        "same_order": names.tolist() == exact['Название товара'].tolist(),
+        "max_relative_error": float(np.max((estimates - truth) / truth)),
+        "guaranteed": int(streamed['Точно в топе'].sum())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк потокового топа товаров")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="размеры в строках, например 1e5 1e6")
+    parser.add_argument("--capacities", type=int, nargs="+", default=DEFAULT_CAPACITIES, help="числа счётчиков")
+    parser.add_argument("--skew", type=float, default=DEFAULT_SKEW,
+                        help="неравномерность продаж товаров в сгенерированных данных (0 — равномерно)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="не мерить пик памяти (быстрее)")
+    parser.add_argument("-o", "--output", default=None, help="файл с результатами (JSON)")
+    args = parser.parse_args(argv)
+
+    environment = get_environment()
+    records = []
+    for size in args.sizes:
+        rows = int(size)
+        path = get_data_file(rows, args.seed, skew=args.skew)
+        print(f"{rows} строк:")
+        data = preprocess_data(load_sales_data(path))
+        for metric in METRIC_COLUMNS:
+            record, exact = measure(f"exact:{metric}", lambda path: load_and_rank(path, metric),
+                                    lambda: path, args.repeat, not args.no_memory)
+            records.append(dict(record, size=rows))
+            true_sums = get_true_sums(data, metric)
+            for capacity in args.capacities:
+                record, streamed = measure(
+                    f"stream:{metric}:{capacity}",
+                    lambda path: stream_top_n_products(path, TOP_N, metric, capacity, CHUNK_SIZE),
+                    lambda: path, args.repeat, not args.no_memory)
+                accuracy = get_accuracy(exact, streamed, true_sums)
+                print(f"    полнота {accuracy['recall']:.2f}, порядок совпал: {'да' if accuracy['same_order'] else 'нет'}, "
+                      f"наибольшая ошибка {accuracy['max_relative_error']:.2%}, гарантированно в топе: {accuracy['guaranteed']}")
+                records.append(dict(record, size=rows, capacity=capacity, **accuracy))
+
+                stream_seconds, exact_seconds = measure_live(data, metric, capacity)
+                print(f"    живой топ: кусок + запрос {stream_seconds * 1000:.1f} мс, "
+                      f"точный запрос по всей истории {exact_seconds * 1000:.1f} мс")
+                records.append({"size": rows, "stage": f"live:{metric}:{capacity}", "seconds": stream_seconds,
+                                "exact_seconds": exact_seconds, "capacity": capacity})
+
+    output = args.output
+    if output is None:
+        commit = (environment["commit"] or "nogit")[:8]
+        output = os.path.join(RESULTS_DIR, f"heavy-hitters-{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "skew": args.skew, "repeat": args.repeat, "results": records},
+                  f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
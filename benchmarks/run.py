@@ -0,0 +1,166 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from generate_data import generate_sales_csv
+from process import (SalesDataset, load_sales_data, preprocess_data, get_operational_data, calculate_revenue_by_period,
+                     calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products,
+                     analyze_inventory_turnover, get_inventory_insights)
+
+
+# Замеры времени и памяти process.py на синтетических данных разного размера.
+# Запуск: python benchmarks/run.py --sizes 1e4 1e5 1e6
+# Результаты пишутся в JSON (benchmarks/results/...), сравнить два прогона: python benchmarks/compare.py old.json new.json
+
+DATA_DIR = os.path.join(BENCHMARKS_DIR, "data")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+DEFAULT_SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_REPEAT = 3
+TOP_N = 10
+
+# Анализы, которые замеряются и на обычной таблице, и на SalesDataset: (имя, функция)
+ANALYSES = [
+    ("get_operational_data", lambda data: get_operational_data(data, "Продажа")),
+    ("calculate_revenue_by_period:D", lambda data: calculate_revenue_by_period(data, "D")),
+    ("calculate_revenue_by_period:W", lambda data: calculate_revenue_by_period(data, "W")),
+    ("calculate_revenue_by_period:M", lambda data: calculate_revenue_by_period(data, "M")),
+    ("calculate_profit_by_period:D", lambda data: calculate_profit_by_period(data, "D")),
+    ("calculate_profit_by_period:W", lambda data: calculate_profit_by_period(data, "W")),
+    ("calculate_profit_by_period:M", lambda data: calculate_profit_by_period(data, "M")),
+    ("aggregate_sales_by_category", aggregate_sales_by_category),
+    ("get_top_n_products:quantity", lambda data: get_top_n_products(data, TOP_N, "quantity")),
+    ("get_top_n_products:revenue", lambda data: get_top_n_products(data, TOP_N, "revenue")),
+    ("analyze_inventory_turnover", lambda data: analyze_inventory_turnover(data, TOP_N))
+]
+
+
+def get_data_file(rows, seed, data_dir=DATA_DIR, skew=0.0):
+    # Сгенерированные файлы переиспользуются между прогонами
+    path = os.path.join(data_dir, f"sales_{rows}_{seed}.csv" if skew == 0 else f"sales_{rows}_{seed}_skew{skew:g}.csv")
+    if not os.path.exists(path):
+        print(f"Генерирую {rows} строк в {path}...")
+        generate_sales_csv(path, rows, seed=seed, skew=skew)
+    return path
+
+
+def count_rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series, SalesDataset)):
+        return len(value)
+    return None
+
+
+def measure(stage, func, setup, repeat, trace_memory):
+    # Выполняет func(setup()) repeat раз, подготовка в замер не входит.
+    # Пик памяти (tracemalloc) меряется отдельным прогоном, чтобы трассировка не искажала время.
+    seconds = []
+    for _ in range(repeat):
+        argument = setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = func(argument)
+            seconds.append(time.perf_counter() - started)
+
+    peak_mb = None
+    if trace_memory:
+        argument = setup()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(argument)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    record = {
+        "stage": stage,
+        "seconds": min(seconds),
+        "runs": seconds,
+        "peak_mb": peak_mb,
+        "rows_in": count_rows(argument),
+        "rows_out": count_rows(result)
+    }
+    print(f"  {stage:<45} {record['seconds']:>9.4f} с" +
+          (f" {peak_mb:>10.1f} МБ" if peak_mb is not None else ""))
+    return record, result
+
+
+def run_size(rows, seed, repeat, trace_memory):
+    path = get_data_file(rows, seed)
+    print(f"{rows} строк:")
+    records = []
+
+    def add(stage, func, setup):
+        record, result = measure(stage, func, setup, repeat, trace_memory)
+        record["size"] = rows
+        records.append(record)
+        return result
+
+    data = add("load_sales_data", load_sales_data, lambda: path)
+    data_clean = add("preprocess_data", preprocess_data, lambda: data)
+    add("SalesDataset", SalesDataset, lambda: data_clean)
+    for name, analysis in ANALYSES:
+        add(name, analysis, lambda: data_clean)
+    # То же на SalesDataset, как в меню программы: каждый прогон на новом наборе, без готовых кэшей
+    for name, analysis in ANALYSES:
+        add(f"dataset:{name}", analysis, lambda: SalesDataset(data_clean))
+    inventory = analyze_inventory_turnover(data_clean, TOP_N)
+    add("get_inventory_insights", get_inventory_insights, lambda: inventory)
+    return records
+
+
+def get_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк process.py на синтетических данных")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="размеры в строках, например 1e4 1e6")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="сколько раз повторять каждый замер")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="не мерить пик памяти (быстрее)")
+    parser.add_argument("-o", "--output", default=None, help="файл с результатами (JSON)")
+    args = parser.parse_args(argv)
+
+    environment = get_environment()
+    records = []
+    for size in args.sizes:
+        records += run_size(int(size), args.seed, args.repeat, not args.no_memory)
+
+    output = args.output
+    if output is None:
+        commit = (environment["commit"] or "nogit")[:8]
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "repeat": args.repeat, "results": records}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
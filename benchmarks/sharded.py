@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+from run import PROJECT_DIR, RESULTS_DIR, get_data_file, get_environment
+
+sys.path.insert(0, PROJECT_DIR)
+
+from process import SalesDataset, load_sales_data, preprocess_data
+from shards import SHARD_KEYS, run_sharded
+
+
+# Анализы по магазинам и районам: время последовательного расчёта (один процесс)
+# и расчёта в нескольких процессах, ускорение относительно последовательного.
+# Запуск: python benchmarks/sharded.py --sizes 1e5 1e6 --workers 2 4 8
+
+DEFAULT_SIZES = [10 ** 5, 10 ** 6]
+DEFAULT_REPEAT = 3
+TOP_N = 10
+ANALYSES = [
+    ("revenue", "D"), ("revenue", "W"), ("revenue", "M"),
+    ("profit", "D"), ("profit", "W"), ("profit", "M"),
+    ("categories", None),
+    ("top", "quantity"), ("top", "revenue"),
+    ("inventory", None)
+]
+
+
+def measure(dataset, by, workers, repeat):
+    # Лучшее время из repeat прогонов; каждый прогон на новом SalesDataset, чтобы не брать запомненные результаты
+    seconds = []
+    for _ in range(repeat):
+        fresh = SalesDataset(dataset.data, {name: (part.start, part.stop) for name, part in dataset.partitions.items()})
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            run_sharded(fresh, by, ANALYSES, TOP_N, workers=workers)
+            seconds.append(time.perf_counter() - started)
+    return min(seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк анализов по магазинам и районам")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="размеры в строках, например 1e5 1e6")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="числа процессов для сравнения (по умолчанию 2, 4 и число ядер)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="файл с результатами (JSON)")
+    args = parser.parse_args(argv)
+
+    environment = get_environment()
+    workers_list = args.workers or sorted({2, 4, os.cpu_count() or 1} - {1})
+    records = []
+    for size in args.sizes:
+        rows = int(size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            dataset = SalesDataset(preprocess_data(load_sales_data(get_data_file(rows, args.seed))))
+        print(f"{rows} строк:")
+        for by in SHARD_KEYS:
+            sequential = measure(dataset, by, 1, args.repeat)
+            print(f"  {by:<10} процессов: 1  {sequential:>9.4f} с")
+            records.append({"size": rows, "stage": f"sharded:{by}:1", "seconds": sequential, "speedup": 1.0})
+            for workers in workers_list:
+                seconds = measure(dataset, by, workers, args.repeat)
+                speedup = sequential / seconds
+                print(f"  {by:<10} процессов: {workers:<2} {seconds:>9.4f} с  ускорение {speedup:.2f}")
+                records.append({"size": rows, "stage": f"sharded:{by}:{workers}", "seconds": seconds, "speedup": speedup})
+
+    output = args.output
+    if output is None:
+        commit = (environment["commit"] or "nogit")[:8]
+        output = os.path.join(RESULTS_DIR, f"sharded-{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "repeat": args.repeat, "results": records}, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# Проверка времени запуска: импорт manager и report не должен тянуть графические библиотеки,
+# а по времени должен почти не отличаться от импорта одного pandas.
+# Запуск: python benchmarks/startup.py, при регрессии скрипт завершается с кодом 1.
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["matplotlib", "matplotlib.pyplot", "seaborn"]
+# Сколько секунд сверх импорта pandas разрешено тратить на запуск
+DEFAULT_BUDGET = 0.25
+DEFAULT_REPEAT = 5
+
+MEASURE_CODE = """
+import json, sys, time
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(modules):
+    # Каждый замер — в новом процессе, чтобы модули не были уже загружены
+    code = MEASURE_CODE.format(modules=modules, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    env.pop("DISPLAY", None)
+    env.pop("WAYLAND_DISPLAY", None)
+    output = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def best_of(modules, repeat):
+    # Минимум из нескольких запусков меньше всего зависит от шума
+    results = [measure_import(modules) for _ in range(repeat)]
+    return min(r["seconds"] for r in results), results[0]["heavy"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени запуска программы")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="допустимая разница с импортом pandas, секунд")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args(argv)
+
+    pandas_seconds, _ = best_of(["pandas"], args.repeat)
+    failed = False
+    for modules in (["manager"], ["report"]):
+        seconds, heavy = best_of(modules, args.repeat)
+        overhead = seconds - pandas_seconds
+        print(f"import {modules[0]}: {seconds:.3f} с (pandas: {pandas_seconds:.3f} с, сверх pandas: {overhead:.3f} с)")
+        if heavy:
+            print(f"  ОШИБКА: при запуске загружены {', '.join(heavy)}")
+            failed = True
+        if overhead > args.budget:
+            print(f"  ОШИБКА: запуск дольше импорта pandas больше чем на {args.budget} с")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
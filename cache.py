@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from process import SalesDataset, load_sales_data, preprocess_data
+from profiling import profiled
+
+
+# Каталог с кэшем можно переопределить через переменную окружения
+CACHE_DIR = os.environ.get("SALES_CACHE_DIR", ".sales_cache")
+# Максимальный размер кэша на диске, после превышения удаляем самые старые записи
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Хэш содержимого считается по HASH_SAMPLE_BLOCKS блокам по HASH_BLOCK_SIZE байт, равномерно
+# разнесённым по файлу (первый — в начале, последний — в конце). Файл до 4 МБ хэшируется целиком
+HASH_BLOCK_SIZE = 64 * 1024
+HASH_SAMPLE_BLOCKS = 64
+
+META_FILE = "meta.json"
+# Версия формата очищенных данных: при изменении clean_sales_data увеличиваем,
+# и старые записи кэша пересобираются (2 — цены и суммы в целых копейках)
+CACHE_FORMAT = 2
+
+
+def file_fingerprint(file_path):
+    # Отпечаток исходного файла: путь, размер, время изменения и хэш содержимого.
+    # Хэш считается при каждом открытии, поэтому правка файла на месте с тем же размером и временем
+    # изменения тоже сбрасывает кэш. Для больших файлов хэшируются только равномерно разнесённые блоки
+    # (не больше HASH_SAMPLE_BLOCKS × HASH_BLOCK_SIZE байт), чтобы открытие кэша не зависело от размера файла:
+    # правку, которая не попала ни в один блок и сохранила размер и время изменения, такой хэш не заметит
+    stat = os.stat(file_path)
+    return {
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "format": CACHE_FORMAT,
+        "content_hash": content_hash(file_path, stat.st_size)
+    }
+
+
+def content_hash(file_path, size):
+    # Хэш всего файла или его выборки из HASH_SAMPLE_BLOCKS блоков
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        if size <= HASH_SAMPLE_BLOCKS * HASH_BLOCK_SIZE:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        else:
+            for i in range(HASH_SAMPLE_BLOCKS):
+                f.seek((size - HASH_BLOCK_SIZE) * i // (HASH_SAMPLE_BLOCKS - 1))
+                digest.update(f.read(HASH_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def cache_key(fingerprint):
+    # Ключ записи кэша строится по всем полям отпечатка,
+    # поэтому любое изменение исходного файла даёт новый ключ
+    raw = json.dumps(fingerprint, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+@profiled
+def save_frame(data_clean, entry_dir):
+    # Каждый столбец сохраняем в отдельный .npy файл.
+    # Строковые столбцы кодируем словарём: целые коды + список уникальных значений.
+    os.makedirs(entry_dir)
+    columns = []
+    for i, col in enumerate(data_clean.columns):
+        series = data_clean[col]
+        name = f"col_{i}"
+        is_categorical = isinstance(series.dtype, pd.CategoricalDtype)
+        if is_categorical or pd.api.types.is_string_dtype(series.dtype):
+            categorical = series if is_categorical else series.astype("category")
+            np.save(os.path.join(entry_dir, f"{name}.codes.npy"), categorical.cat.codes.to_numpy())
+            np.save(os.path.join(entry_dir, f"{name}.categories.npy"),
+                    categorical.cat.categories.to_numpy().astype(str))
+            kind = "category" if is_categorical else "object"
+        else:
+            np.save(os.path.join(entry_dir, f"{name}.npy"), series.to_numpy())
+            kind = "array"
+        columns.append({"name": col, "file": name, "kind": kind})
+
+    np.save(os.path.join(entry_dir, "index.npy"), data_clean.index.to_numpy())
+    return columns
+
+
+@profiled
+def load_frame(entry_dir, columns):
+    # Собираем DataFrame из .npy файлов без чтения и копирования: файлы отображаются в память
+    # только для чтения (mmap), поэтому открытие не зависит от размера данных, а страницы
+    # одних и тех же файлов делятся между всеми процессами, которые открыли этот кэш.
+    # В память целиком читаются только словари категорий.
+    def load_column(path):
+        # Обычный ndarray поверх отображения (np.memmap только оборачивает тот же буфер)
+        return np.asarray(np.load(path, mmap_mode="r"))
+
+    data = {}
+    for column in columns:
+        path = os.path.join(entry_dir, column["file"])
+        if column["kind"] == "array":
+            data[column["name"]] = load_column(f"{path}.npy")
+        else:
+            # Коды записаны самим pandas, поэтому повторная проверка диапазона (полный проход) не нужна
+            values = pd.Categorical.from_codes(
+                load_column(f"{path}.codes.npy"),
+                np.load(f"{path}.categories.npy").astype(object), validate=False)
+            data[column["name"]] = values if column["kind"] == "category" else np.asarray(values, dtype=object)
+
+    index = load_column(os.path.join(entry_dir, "index.npy"))
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def get_entry_size(entry_dir):
+    return sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+
+
+def read_meta(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def evict_old_entries(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # Удаляем записи, начиная с тех, которыми дольше всего не пользовались,
+    # пока суммарный размер кэша не уложится в лимит
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and not entry.name.startswith(".tmp"):
+            meta = read_meta(entry.path)
+            last_used = meta["last_used"] if meta else 0
+            entries.append((last_used, get_entry_size(entry.path), entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def remove_stale_entries(cache_dir, fingerprint, key):
+    # Если исходный файл изменился, старые записи для того же пути больше не нужны
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and entry.name != key and not entry.name.startswith(".tmp"):
+            meta = read_meta(entry.path)
+            if meta is None or meta["fingerprint"]["path"] == fingerprint["path"]:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+@profiled
+def load_cached_dataset(file_path, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # Возвращает SalesDataset: из кэша, если исходный файл не менялся,
+    # иначе читает и обрабатывает файл заново и сохраняет результат в кэш.
+    # В кэше строки лежат уже в порядке SalesDataset (по типу операции и дате) вместе с границами частей,
+    # поэтому набор данных открывается поверх отображённых в память столбцов без сортировки и копирования.
+    try:
+        fingerprint = file_fingerprint(file_path)
+    except OSError:
+        # Файла нет или он недоступен, сообщение об ошибке выведет load_sales_data
+        data_clean = preprocess_data(load_sales_data(file_path))
+        return None if data_clean is None else SalesDataset(data_clean)
+
+    key = cache_key(fingerprint)
+    entry_dir = os.path.join(cache_dir, key)
+    meta = read_meta(entry_dir)
+    if meta is not None:
+        try:
+            dataset = SalesDataset(load_frame(entry_dir, meta["columns"]), meta["partitions"])
+        except (OSError, ValueError, KeyError):
+            # Повреждённая запись или запись старого формата (без границ частей) — строим заново
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        else:
+            meta["last_used"] = time.time()
+            write_meta(entry_dir, meta)
+            report_removed(meta["removed"])
+            return dataset
+
+    data = load_sales_data(file_path)
+    if data is None:
+        return None
+    data_clean = preprocess_data(data)
+    removed = len(data) - len(data_clean)
+    dataset = SalesDataset(data_clean)
+
+    # Ошибки записи кэша не должны мешать анализу, поэтому просто пропускаем кэширование
+    tmp_dir = os.path.join(cache_dir, f".tmp-{key}-{os.getpid()}")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        remove_stale_entries(cache_dir, fingerprint, key)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        columns = save_frame(dataset.data, tmp_dir)
+        write_meta(tmp_dir, {
+            "fingerprint": fingerprint,
+            "columns": columns,
+            "partitions": {name: [part.start, part.stop] for name, part in dataset.partitions.items()},
+            "removed": removed,
+            "last_used": time.time()
+        })
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        evict_old_entries(cache_dir, max_bytes)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return dataset
+
+
+
+def load_preprocessed(file_path, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    # Очищенные данные через кэш (строки в порядке SalesDataset, столбцы только для чтения)
+    dataset = load_cached_dataset(file_path, cache_dir, max_bytes)
+    return None if dataset is None else dataset.data
+
+
+def write_meta(entry_dir, meta):
+    with open(os.path.join(entry_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def report_removed(removed):
+    # То же сообщение, что выводит preprocess_data
+    if removed > 0:
+        print(f"Удалено строк с пустыми значениями: {removed}")
+
@@ -0,0 +1,349 @@
+import argparse
+import os
+import sqlite3
+import sys
+from urllib.request import pathname2url
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+from process import (DEFAULT_CHUNK_SIZE, SalesDataset, get_operation_keys, get_period_freq, get_expense_operations,
+                     build_revenue_table, build_profit_table, build_inventory_table, to_rubles, TOP_GROUP_COLUMNS)
+from streaming import RESULT_COLUMNS
+
+
+# Очищенные данные в файле SQLite и анализы прямо в базе.
+# Данные один раз выгружаются в базу (export_to_sqlite), после чего выручку и прибыль по периодам,
+# категории, топ-N и движение товаров можно считать запросами SQL, не загружая историю в pandas:
+# в Python приходят только готовые итоги. Результаты совпадают с функциями process.py.
+#
+#   python database.py export "Data 1.csv" sales.db
+#   python database.py query sales.db -a revenue:W top:revenue -n 5
+#
+# Деньги хранятся в копейках, как в process.py, даты — строками ГГГГ-ММ-ДД,
+# тип операции — в нижнем регистре (как ключи частей SalesDataset).
+
+TABLE = "sales"
+
+# Столбцы таблицы: имя в базе -> (столбец очищенных данных, тип)
+SQL_COLUMNS = {
+    "id": ("ID операции", "INTEGER"),
+    "date": ("Дата", "TEXT"),
+    "store": ("Адрес магазина", "TEXT"),
+    "district": ("Район магазина", "TEXT"),
+    "article": ("Артикул", "INTEGER"),
+    "name": ("Название товара", "TEXT"),
+    "department": ("Отдел товара", "TEXT"),
+    "quantity": ("Количество упаковок, шт.", "NUMERIC"),
+    "operation": ("Операция", "TEXT"),
+    "price": ("Цена коп./шт.", "INTEGER"),
+    "amount": ("Сумма операции, коп.", "INTEGER")
+}
+
+# Индексы: имя -> столбцы. Индексы по типу операции и по артикулу покрывающие: в них есть
+# все столбцы, нужные итогам по периодам и движению товаров, поэтому эти запросы читают
+# только индекс (по порядку ключей), а не строки таблицы вразброс
+INDEXES = {
+    "sales_date": "date",
+    "sales_article": "article, name, operation, quantity, amount",
+    "sales_operation": "operation, date, amount",
+    "sales_store": "store"
+}
+
+# Начало периода из даты: неделя заканчивается в понедельник, месяц — последним днём, как в get_period_freq
+PERIOD_EXPRESSIONS = {
+    "D": "day",
+    "W": "date(day, 'weekday 1')",
+    "M": "date(day, 'start of month', '+1 month', '-1 day')"
+}
+
+# Метрика топа -> столбец базы
+METRIC_COLUMNS = {
+    "quantity": "quantity",
+    "revenue": "amount"
+}
+
+# Столбцы, по которым можно строить топ в каждой группе (те же, что у process.get_top_n_products)
+GROUP_COLUMNS = {column: name for name, (column, _) in SQL_COLUMNS.items() if column in TOP_GROUP_COLUMNS}
+
+
+def get_column_values(values):
+    # Значения столбца для записи в базу: категории — строками, даты — ГГГГ-ММ-ДД, числа — числами Python
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return np.asarray(values.cat.categories, dtype=object)[values.cat.codes.to_numpy()].tolist()
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return np.datetime_as_string(values.to_numpy().astype("datetime64[D]")).tolist()
+    return values.to_numpy().tolist()
+
+
+def get_export_columns(data):
+    # Столбцы базы, которые есть в данных, и их значения для одного куска строк.
+    # В агрегатах файла, прочитанного кусками, нет ID, района и цены — эти столбцы останутся пустыми
+    columns = [name for name, (column, _) in SQL_COLUMNS.items() if column in data.columns]
+
+    def get_values(chunk):
+        values = []
+        for name in columns:
+            column = chunk[SQL_COLUMNS[name][0]]
+            if name == "operation":
+                column = pd.Series(get_operation_keys(column))
+            values.append(get_column_values(column))
+        return zip(*values)
+
+    return columns, get_values
+
+
+@profiled
+def export_to_sqlite(data_clean, db_path, chunksize=DEFAULT_CHUNK_SIZE):
+    # Выгружает очищенные данные (DataFrame или SalesDataset) в файл SQLite и строит индексы.
+    # База сначала пишется во временный файл и заменяет старую только целиком.
+    # Возвращает число выгруженных строк или None при ошибке.
+    data = data_clean.data if isinstance(data_clean, SalesDataset) else data_clean
+    columns, get_values = get_export_columns(data)
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        connection = sqlite3.connect(tmp_path)
+        try:
+            # Файл временный: журнал и синхронизация с диском при загрузке не нужны
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            definitions = ", ".join(f"{name} {sql_type}" for name, (_, sql_type) in SQL_COLUMNS.items())
+            connection.execute(f"CREATE TABLE {TABLE} ({definitions})")
+
+            insert = f"INSERT INTO {TABLE} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            with connection:
+                for start in range(0, len(data), chunksize):
+                    connection.executemany(insert, get_values(data.iloc[start:start + chunksize]))
+            # Индексы строим после загрузки: так быстрее, чем обновлять их на каждой строке
+            with connection:
+                for index, index_columns in INDEXES.items():
+                    connection.execute(f"CREATE INDEX {index} ON {TABLE} ({index_columns})")
+            connection.execute("ANALYZE")
+        finally:
+            connection.close()
+        os.replace(tmp_path, db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Не удалось сохранить базу {db_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return len(data)
+
+
+def open_database(db_path):
+    # Открывает базу только для чтения. Возвращает соединение или None, если это не база продаж
+    if not os.path.isfile(db_path):
+        print(f"Файл базы не найден: {db_path}")
+        return None
+    try:
+        connection = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+        found = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)).fetchone()
+    except sqlite3.Error:
+        found = None
+    if found is None:
+        print(f"Файл не похож на базу продаж: {db_path}")
+        return None
+    return connection
+
+
+def get_date_condition(start=None, end=None):
+    # Условие на даты start..end (включительно) и его параметры. Даты в базе — дни без времени,
+    # поэтому начало с временем округляется вверх до дня, а конец — вниз
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(pd.Timestamp(start).ceil("D").strftime("%Y-%m-%d"))
+    if end is not None:
+        conditions.append("date <= ?")
+        params.append(pd.Timestamp(end).floor("D").strftime("%Y-%m-%d"))
+    return conditions, params
+
+
+def get_operation_condition(operation_types, exclude=False):
+    # Условие на тип операции: входит (или при exclude=True не входит) в operation_types.
+    # Как и в DailyCube.rollup, типы сравниваются с ключами в нижнем регистре как есть
+    placeholders = ", ".join("?" * len(operation_types))
+    return f"operation {'NOT IN' if exclude else 'IN'} ({placeholders})", list(operation_types)
+
+
+def get_where(operation_types, exclude=False, start=None, end=None):
+    condition, params = get_operation_condition(operation_types, exclude)
+    date_conditions, date_params = get_date_condition(start, end)
+    return " AND ".join([condition] + date_conditions), params + date_params
+
+
+@profiled
+def rollup(connection, operation_types, period='D', exclude=False, start=None, end=None):
+    # Суммы операций (в копейках) по периодам, как DailyCube.rollup: сначала итоги по дням
+    # (по индексу тип операции + дата), затем по периодам. Периоды без операций заполняются нулями.
+    # Возвращает Series с датой периода в индексе или None, если подходящих строк нет.
+    where, params = get_where(operation_types, exclude, start, end)
+    rows = connection.execute(
+        f"SELECT {PERIOD_EXPRESSIONS[period]} AS period, SUM(total) FROM "
+        f"(SELECT date AS day, SUM(amount) AS total FROM {TABLE} WHERE {where} GROUP BY date) "
+        f"GROUP BY period ORDER BY period", params).fetchall()
+    if not rows:
+        return None
+    periods = pd.to_datetime([period for period, _ in rows])
+    totals = pd.Series([total for _, total in rows], index=periods)
+    return totals.reindex(pd.date_range(periods[0], periods[-1], freq=get_period_freq(period)), fill_value=0)
+
+
+@profiled
+def calculate_revenue_by_period(connection, period='D', start=None, end=None):
+    # Выручка по периодам, как process.calculate_revenue_by_period
+    totals = rollup(connection, ["продажа"], period, start=start, end=end)
+    if totals is None:
+        return pd.DataFrame({'Дата': pd.Series(dtype='datetime64[ns]'), 'Выручка по периоду': pd.Series(dtype=float)})
+    return build_revenue_table(totals)
+
+
+@profiled
+def calculate_profit_by_period(connection, period='D', start=None, end=None):
+    # Прибыль по периодам, как process.calculate_profit_by_period
+    income_by_period = rollup(connection, ["продажа"], period, start=start, end=end)
+    if income_by_period is None:
+        print("Нет данных о продажах для расчета доходов")
+        return None
+    expense_operations, expense_exclude = get_expense_operations()
+    expense_by_period = rollup(connection, expense_operations, period, expense_exclude, start, end)
+    return build_profit_table(income_by_period, expense_by_period)
+
+
+@profiled
+def aggregate_sales_by_category(connection):
+    # Выручка, проданные упаковки и число различных товаров по отделам, как process.aggregate_sales_by_category
+    rows = connection.execute(
+        f"SELECT department, SUM(amount), SUM(quantity), COUNT(DISTINCT article) FROM {TABLE} "
+        f"WHERE operation = 'продажа' GROUP BY department ORDER BY department").fetchall()
+    category_stats = pd.DataFrame(rows, columns=['Отдел товара', 'Выручка', 'Проданных единиц', 'Уникальных товаров'])
+    category_stats['Выручка'] = to_rubles(category_stats['Выручка'])
+    return category_stats.set_index('Отдел товара')
+
+
+@profiled
+def get_top_n_products(connection, n=5, metric='quantity', date='all', start=None, end=None, by=None):
+    # Топ n товаров, как process.get_top_n_products: при равных суммах раньше идёт товар
+    # с меньшим названием, с by — топ n в каждой группе (группы по порядку)
+    if metric not in METRIC_COLUMNS:
+        return None
+    if by is not None and by not in GROUP_COLUMNS:
+        print(f"Топ в базе строится только по группам: {', '.join(GROUP_COLUMNS)}")
+        return None
+    if date != 'all':
+        start = end = date
+
+    where, params = get_where(["продажа"], start=start, end=end)
+    result_column = RESULT_COLUMNS[metric]
+    if by is None:
+        rows = connection.execute(
+            f"SELECT name, SUM({METRIC_COLUMNS[metric]}) AS total FROM {TABLE} WHERE {where} "
+            f"GROUP BY name ORDER BY total DESC, name LIMIT ?", params + [max(n, 0)]).fetchall()
+        columns = ['Название товара', result_column]
+    else:
+        # Место товара в своей группе считает оконная функция, в Python приходят только первые n мест
+        rows = connection.execute(
+            f"SELECT grp, name, total FROM ("
+            f"SELECT grp, name, total, ROW_NUMBER() OVER (PARTITION BY grp ORDER BY total DESC, name) AS place FROM ("
+            f"SELECT {GROUP_COLUMNS[by]} AS grp, name, SUM({METRIC_COLUMNS[metric]}) AS total FROM {TABLE} "
+            f"WHERE {where} GROUP BY grp, name)) "
+            f"WHERE place <= ? ORDER BY grp, place", params + [max(n, 0)]).fetchall()
+        columns = [by, 'Название товара', result_column]
+
+    top = pd.DataFrame(rows, columns=columns)
+    if metric == 'revenue':
+        top[result_column] = to_rubles(top[result_column])
+    return top
+
+
+@profiled
+def analyze_inventory_turnover(connection, top_n=10):
+    # Движение товаров, как process.analyze_inventory_turnover: top_n товаров с наибольшей
+    # по модулю разницей продаж и поступлений, при равенстве — по артикулу и названию
+    rows = connection.execute(
+        f"SELECT article, name, sold, received, revenue, costs FROM ("
+        f"SELECT article, name, "
+        f"SUM(CASE WHEN operation = 'продажа' THEN quantity ELSE 0 END) AS sold, "
+        f"SUM(CASE WHEN operation = 'поступление' THEN quantity ELSE 0 END) AS received, "
+        f"SUM(CASE WHEN operation = 'продажа' THEN amount ELSE 0 END) AS revenue, "
+        f"SUM(CASE WHEN operation = 'поступление' THEN amount ELSE 0 END) AS costs "
+        f"FROM {TABLE} WHERE operation IN ('продажа', 'поступление') GROUP BY article, name) "
+        f"ORDER BY ABS(sold - received) DESC, article, name LIMIT ?", [max(top_n, 0)]).fetchall()
+    turnover = pd.DataFrame(rows, columns=['Артикул', 'Название товара', 'sold', 'received', 'revenue', 'costs'])
+    return build_inventory_table(
+        turnover[['Артикул', 'Название товара']],
+        *(turnover[column].to_numpy() for column in ['sold', 'received', 'revenue', 'costs'])
+    )
+
+
+def compute_sql_analysis(connection, name, option, top_n=10, date="all"):
+    # Таблица одного анализа по базе: name и option — как в report.parse_analysis
+    if name == "revenue":
+        return calculate_revenue_by_period(connection, option)
+    if name == "profit":
+        return calculate_profit_by_period(connection, option)
+    if name == "categories":
+        return aggregate_sales_by_category(connection)
+    if name == "top":
+        return get_top_n_products(connection, top_n, option, date)
+    if name == "inventory":
+        return analyze_inventory_turnover(connection, top_n)
+    print("Движение остатков по базе не считается, используйте report.py")
+    return None
+
+
+def main(argv=None):
+    from manager import load_dataset
+    from report import parse_analysis
+
+    parser = argparse.ArgumentParser(description="Выгрузка данных о продажах в SQLite и анализы по базе")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="загрузить и очистить данные и сохранить их в базу")
+    export_parser.add_argument("source", help="CSV-файл, каталог или шаблон (например, data/*.csv)")
+    export_parser.add_argument("database", help="файл базы SQLite")
+    export_parser.add_argument("-c", "--chunksize", type=int, default=None,
+                               help="читать файл кусками по столько строк и выгрузить только агрегаты")
+
+    query_parser = commands.add_parser("query", help="выполнить анализы по базе и вывести таблицы")
+    query_parser.add_argument("database", help="файл базы SQLite")
+    query_parser.add_argument("-a", "--analyses", nargs="+", default=["revenue:D"],
+                              help="анализы: revenue[:D|W|M], profit[:D|W|M], categories, top[:quantity|revenue], inventory")
+    query_parser.add_argument("-n", "--top-n", type=int, default=10, help="размер топа товаров и отчёта по движению")
+    query_parser.add_argument("-d", "--date", default="all", help="дата ГГГГ-ММ-ДД для топа товаров или all")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        dataset = load_dataset(args.source, args.chunksize)
+        if dataset is None:
+            print("Не получилось загрузить данные.")
+            return 1
+        rows = export_to_sqlite(dataset, args.database)
+        if rows is None:
+            return 1
+        print(f"В базу {args.database} выгружено строк: {rows}")
+        return 0
+
+    connection = open_database(args.database)
+    if connection is None:
+        return 1
+    try:
+        for spec in args.analyses:
+            analysis = parse_analysis(spec)
+            if analysis is None:
+                print(f"Неизвестный анализ: {spec}")
+                return 1
+            table = compute_sql_analysis(connection, *analysis, args.top_n, args.date)
+            if table is not None:
+                print(f"{spec}:")
+                print(table.to_string())
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
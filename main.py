@@ -1,4 +1,10 @@
+import sys
+
 from manager import get_user_request
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        # С аргументами командной строки работаем в пакетном режиме без вопросов
+        from report import main
+        sys.exit(main(sys.argv[1:]))
     get_user_request()
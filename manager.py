@@ -1,11 +1,64 @@
-import matplotlib.pyplot as plt
+import os
+import sys
+
 import numpy as np
-import seaborn as sns
-from process import load_sales_data, preprocess_data, calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products, calculate_revenue_by_period, get_inventory_insights, analyze_inventory_turnover
+from cache import load_cached_dataset
+from profiling import profiled
+from process import SalesDataset, fold_sales_chunks, is_multi_file_source, load_sales_files, calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products, calculate_revenue_by_period, get_inventory_insights, analyze_inventory_turnover
 
-def present_revenue_by_period(data, period='D'):
-    revenue_data = calculate_revenue_by_period(data, period)# Получаем данные из функции calculate_revenue_by_period
-    
+# Бэкенды matplotlib, которые не открывают окон
+NON_INTERACTIVE_BACKENDS = {'agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template'}
+
+
+def has_display():
+    # На Linux без X11/Wayland окно с графиком открыть нельзя (например, на сервере или по ssh)
+    if sys.platform.startswith('linux'):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
+
+
+@profiled
+def get_pyplot():
+    # matplotlib загружаем только при первом построении графика, а не при запуске программы.
+    # Если экрана нет и бэкенд не задан через MPLBACKEND, выбираем Agg, который не требует GUI.
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        if not has_display() and 'MPLBACKEND' not in os.environ:
+            matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+
+@profiled
+def show_figure(fig, name):
+    # Показывает график в окне, а без экрана сохраняет его в PNG в текущий каталог
+    plt = get_pyplot()
+    if plt.get_backend().lower() not in NON_INTERACTIVE_BACKENDS:
+        plt.show()
+        return
+    path = f"{name}.png"
+    fig.savefig(path)
+    plt.close(fig)
+    print(f"Экран недоступен, график сохранён в файл {path}")
+
+
+
+def set_plot_style():
+    import seaborn as sns
+    plt = get_pyplot()
+    # Настройка стиля графиков
+    plt.style.use('seaborn-v0_8')
+    sns.set_palette("husl")
+
+
+
+@profiled
+def plot_revenue_by_period(revenue_data, period='D'):
+    # Строит круговую диаграмму выручки по готовой таблице и возвращает фигуру
+    import seaborn as sns
+    plt = get_pyplot()
     if period == 'D':
         labels = revenue_data['Дата'].dt.strftime('%Y-%m-%d')# Получаем названия периодов
         title_period = "дням"
@@ -18,23 +71,29 @@ def present_revenue_by_period(data, period='D'):
     
     values = revenue_data['Выручка по периоду']  # Данные для диаграммы
     
-    plt.figure(figsize=(10, 8))
+    fig = plt.figure(figsize=(10, 8))
     
     colors = sns.color_palette("husl", len(values))
     plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, colors=colors)
     
     plt.title(f'Распределение выручки по {title_period}', fontsize=16, fontweight='bold')
     plt.axis('equal')
-    plt.tight_layout() # Делаем диаграмму круглой и оторбажаем
-    plt.show()
+    plt.tight_layout() # Делаем диаграмму круглой
+    return fig
 
 
 
-def visualize_category_analysis(data_clean):
-    # Настройка стиля графиков
-    plt.style.use('seaborn-v0_8')
-    sns.set_palette("husl")
-    category_stats = aggregate_sales_by_category(data_clean)
+def present_revenue_by_period(data, period='D'):
+    revenue_data = calculate_revenue_by_period(data, period)# Получаем данные из функции calculate_revenue_by_period
+    show_figure(plot_revenue_by_period(revenue_data, period), f"revenue_{period}")
+
+
+
+@profiled
+def plot_category_analysis(category_stats):
+    # Строит столбчатые диаграммы по категориям и возвращает фигуру (или None, если строить нечего)
+    set_plot_style()
+    plt = get_pyplot()
     # Визуализирует анализ по категориям
     if category_stats is None or len(category_stats) == 0:
         print("Нет данных для визуализации")
@@ -58,14 +117,37 @@ def visualize_category_analysis(data_clean):
         axes[i].tick_params(axis='x', rotation=45)
     
     plt.tight_layout()
-    plt.show()
+    return fig
+
+
+
+def visualize_category_analysis(data_clean):
+    category_stats = aggregate_sales_by_category(data_clean)
+    fig = plot_category_analysis(category_stats)
+    if fig is not None:
+        show_figure(fig, "categories")
+
+
+
+@profiled
+def plot_profit_by_period(profit_data):
+    # Строит график прибыли по готовой таблице и возвращает фигуру
+    set_plot_style()
+    plt = get_pyplot()
+    fig = plt.figure(figsize=(12, 6))
+    plt.plot(profit_data['Дата'], profit_data['Прибыль по периоду'], marker='o', linewidth=2)
+    plt.title('Динамика прибыли по дням', fontweight='bold')
+    plt.xlabel('Дата')
+    plt.ylabel('Прибыль, руб.')
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    return fig
 
 
 
 def analyze_real_data(cleaned_data, period):
-    # Настройка стиля графиков
-    plt.style.use('seaborn-v0_8')
-    sns.set_palette("husl")
+    set_plot_style()
     print("="*40)
     
     # Анализ 1: Прибыль по периодам
@@ -79,15 +161,7 @@ def analyze_real_data(cleaned_data, period):
         print(profit_daily.head(10))
         
         # Визуализация прибыли
-        plt.figure(figsize=(12, 6))
-        plt.plot(profit_daily['Дата'], profit_daily['Прибыль по периоду'], marker='o', linewidth=2)
-        plt.title('Динамика прибыли по дням', fontweight='bold')
-        plt.xlabel('Дата')
-        plt.ylabel('Прибыль, руб.')
-        plt.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
+        show_figure(plot_profit_by_period(profit_daily), f"profit_{period}")
         
         # Статистика по прибыли
         print(f"\nСтатистика прибыли:")
@@ -127,13 +201,14 @@ def analyze_real_data(cleaned_data, period):
 
 
 
-# Вывести топ продуктов
-def present_top_n_products(data, n, metric, date):
-    # Создание датафрейма из функции в другом модуле
-    df = get_top_n_products(data, n, metric, date)
-
+@profiled
+def plot_top_n_products(df, metric):
+    # Строит горизонтальную столбчатую диаграмму топа товаров и возвращает фигуру
+    import seaborn as sns
+    plt = get_pyplot()
+    fig = plt.figure()
     # Палитра цветов из сиборна
-    colors = sns.color_palette("husl", n)
+    colors = sns.color_palette("husl", len(df))
     # Для каждой метрики строим горизонтальный барчарт
     if metric == 'revenue':
         plt.barh(df["Название товара"], df["Сумма_Сумма операции"], edgecolor='black', color=colors)
@@ -143,7 +218,15 @@ def present_top_n_products(data, n, metric, date):
         plt.barh(df["Название товара"], df["Сумма_Количество упаковок, шт."], edgecolor='black', color=colors)
         plt.title("Топ самых продаваемых товаров по количеству")
         plt.ylabel("Упаковок")
-    plt.show()
+    return fig
+
+
+
+# Вывести топ продуктов
+def present_top_n_products(data, n, metric, date):
+    # Создание датафрейма из функции в другом модуле
+    df = get_top_n_products(data, n, metric, date)
+    show_figure(plot_top_n_products(df, metric), f"top_{metric}")
 
 
 # Выводит отчет по движению товаров
@@ -205,6 +288,26 @@ def print_inventory_report(data, top_n):
 
 
 
+@profiled
+def load_dataset(file_path, chunksize=None, workers=None):
+    # Загружает и очищает данные, возвращает SalesDataset или None.
+    # С chunksize файл, который не помещается в память, читается кусками и сразу сворачивается в агрегаты.
+    # workers — число процессов для чтения нескольких файлов (по умолчанию по числу ядер)
+    if is_multi_file_source(file_path):
+        # несколько файлов читаем параллельно, каждый в своём процессе
+        data_clean = load_sales_files(file_path, workers)
+        if data_clean is None:
+            return None
+        # Один раз разбиваем строки по типам операций, дальше все анализы работают с готовыми частями
+        return SalesDataset(data_clean)
+
+    if chunksize is not None:
+        return fold_sales_chunks(file_path, chunksize)
+    # при повторном запуске открываем данные из кэша, отображённого в память
+    return load_cached_dataset(file_path)
+
+
+
 def get_user_request():
     print('=' * 40)
     print("Вас приветствует визуализатор продаж.")
@@ -213,14 +316,13 @@ def get_user_request():
     print()
 
     # спрашиваем путь к файлу
-    file_path = input("Введите путь к файлу CSV (например: Данные 1.csv): ").strip()
+    file_path = input("Введите путь к файлу CSV, каталогу или шаблону (например: Данные 1.csv или data/*.csv): ").strip()
 
     # пробуем загрузить и подготовить данные
-    data = load_sales_data(file_path)
-    data_clean = preprocess_data(data)
+    dataset = load_dataset(file_path)
 
     # если что-то пошло не так — завершаем
-    if data_clean is None:
+    if dataset is None:
         print("Не получилось загрузить данные. Завершаю программу.")
         return
     
@@ -265,7 +367,7 @@ def get_user_request():
                     print("Некорректный выбор. Пожалуйста, введите число от 1 до 3.")
             
             print(f"\nСтрою круговую диаграмму распределения выручки по {period_name}...")
-            present_revenue_by_period(data_clean, period)
+            present_revenue_by_period(dataset, period)
 
         if user_request == '2':
             while True:
@@ -291,11 +393,11 @@ def get_user_request():
                     print("Некорректный выбор. Пожалуйста, введите число от 1 до 3.")
             
             print(f"\nСтрою визуализацию распределения выручки по {period_name}...")
-            analyze_real_data(data_clean, period)
+            analyze_real_data(dataset, period)
 
         if user_request == '3':
             print("Представляю анализ по категориям.")
-            visualize_category_analysis(data_clean)
+            visualize_category_analysis(dataset)
 
         if user_request == '4':
             while True:
@@ -324,13 +426,13 @@ def get_user_request():
                 if s == "0":
                     date = 'all'
                     break
-                elif s in data_clean["Дата"].unique():
+                elif dataset.has_date(s):
                     date = s
                     break
                 else:
                     print("Дата введена некорректно, попробуйте еще раз.")
             print(f"\nСтрою столбчатую диаграмму {n} самых продаваемый товаров по {'выручке' if metric == 'quantity' else 'количеству'} за {'весь период' if date == 'all' else date}...")
-            present_top_n_products(data_clean, n, metric, date)
+            present_top_n_products(dataset, n, metric, date)
         
         if user_request == '5':
             while True:
@@ -342,7 +444,7 @@ def get_user_request():
                 except:
                     print("Пожалуйста, введите целое положительное число")
 
-            print_inventory_report(data_clean, n)
+            print_inventory_report(dataset, n)
 
 
         # после выполнения действия спрашиваем, хочет ли пользователь продолжить работу с программой
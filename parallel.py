@@ -0,0 +1,21 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Общий пул процессов для чтения файлов, рендеринга графиков и анализов по частям данных.
+
+
+def map_in_processes(func, jobs, workers=None, initializer=None):
+    # Выполняет func для каждого задания и возвращает результаты в порядке заданий.
+    # workers — число процессов (по умолчанию по числу ядер, но не больше числа заданий).
+    # С одним процессом или одним заданием всё считается здесь же, без пула и передачи данных между процессами.
+    # initializer вызывается один раз в каждом рабочем процессе.
+    jobs = list(jobs)
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or len(jobs) <= 1:
+        return [func(job) for job in jobs]
+    # Задания раздаём пачками, чтобы не гонять их по одному через очередь процессов
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+        return list(executor.map(func, jobs, chunksize=chunksize))
@@ -1,8 +1,29 @@
+import codecs
+import functools
+import glob
+import inspect
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 
+from parallel import map_in_processes
+from profiling import profiled
+from topk import get_group_ranks, select_top_positions, select_top_bottom_positions, select_top_per_group
 
-def load_sales_data(file_path):
-    REQUIRED_COLS = [
+
+# Загрузка, очистка и анализ данных о продажах.
+#
+# В очищенной таблице (clean_sales_data, preprocess_data) деньги хранятся в целых копейках (int64),
+# поэтому денежные столбцы называются иначе, чем раньше:
+#   'Цена руб./шт.'  -> 'Цена коп./шт.'         (цена из файла в копейках, на том же месте)
+#   'Сумма операции' -> 'Сумма операции, коп.'  (количество × цена, в копейках)
+# Чтобы получить рубли, делите на KOPECKS_PER_RUBLE (to_rubles). Готовые таблицы анализов
+# (выручка, прибыль, категории, топ, движение товаров) по-прежнему в рублях.
+
+REQUIRED_COLS = [
     "ID операции",
     "Дата",
     "Адрес магазина",
@@ -13,94 +34,895 @@ def load_sales_data(file_path):
     "Количество упаковок, шт.",
     "Операция",
     "Цена руб./шт."
-    ]
+]
+
+# Столбцы с небольшим числом уникальных значений храним как категории:
+# каждая строка хранится один раз в словаре, а в таблице лежат небольшие целые коды
+CATEGORICAL_COLS = [
+    "Операция",
+    "Отдел товара",
+    "Адрес магазина",
+    "Район магазина",
+    "Название товара"
+]
+
+# Сколько байт из начала файла читаем, чтобы определить кодировку
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# Сколько строк читаем за один раз в потоковом режиме
+DEFAULT_CHUNK_SIZE = 100_000
+# Сколько последних результатов анализа запоминает один SalesDataset
+MEMO_SIZE = 64
+# Деньги внутри хранятся в целых копейках (int64), в рубли переводятся только в готовых таблицах
+KOPECKS_PER_RUBLE = 100
+# Столбцы, по которым можно строить топ в каждой группе. 'Название товара' в списке нет:
+# по нему строится сам топ, и группа из одного товара смысла не имеет
+TOP_GROUP_COLUMNS = ['Адрес магазина', 'Артикул', 'Отдел товара']
+
+
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    # Определяем кодировку по небольшому куску файла, а не перечитываем весь файл.
+    # Инкрементальный декодер не ругается на символ, который обрезан границей выборки.
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1251"
+    return "utf-8"
+
+
+@profiled
+def read_sales_csv(file_path, encoding, **kwargs):
+    # Типизированное чтение: текстовые столбцы сразу читаются как категории,
+    # а цена с десятичной запятой сразу становится числом, без промежуточного строкового столбца
+    return pd.read_csv(
+        file_path,
+        sep=";",
+        encoding=encoding,
+        decimal=",",
+        dtype={col: "category" for col in CATEGORICAL_COLS},
+        **kwargs
+    )
+
+
+def drop_comma_quantities(data):
+    # decimal="," нужен только для цены. Количество с запятой раньше не считалось числом
+    # и строка удалялась, поэтому дробное количество (оно могло появиться только из записи
+    # через запятую: точка не даёт столбцу стать числовым) снова считаем пропуском
+    col = "Количество упаковок, шт."
+    if col in data.columns and pd.api.types.is_float_dtype(data[col].dtype):
+        quantities = data[col]
+        data[col] = quantities.where(quantities.isna() | (quantities % 1 == 0))
+    return data
+
+
+def get_missing_columns(data):
+    # Возвращает список обязательных столбцов, которых нет в таблице
+    return [col for col in REQUIRED_COLS if col not in data.columns]
+
+
+def read_sales_file(file_path):
+    # Читает один файл и проверяет его структуру.
+    # Возвращает пару (данные, сообщение об ошибке), одно из значений всегда None.
+
     # Перехватываем любую ошибку чтения файла, чтобы пользователь не видел огромный трейсбек.
-    # Вместо этого выводим одно понятное сообщение и завершаем функцию.
+    # Вместо этого возвращаем одно понятное сообщение.
     try:
-        data = pd.read_csv(file_path, sep=";", encoding="utf-8")
-    except Exception:
+        encoding = detect_encoding(file_path)
         try:
-            data = pd.read_csv(file_path, sep=";", encoding="cp1251")
-        except Exception:
-            print(f"Не удалось прочесть файл, проверьте кодировку и разделитель: {file_path}")
-            return None
+            data = read_sales_csv(file_path, encoding)
+        except UnicodeDecodeError:
+            # Начало файла оказалось в UTF-8, а дальше встретилась другая кодировка
+            data = read_sales_csv(file_path, "cp1251")
+    except Exception:
+        return None, f"Не удалось прочесть файл, проверьте кодировку и разделитель: {file_path}"
 
     # После чтения файла проверяем структуру таблицы, если столбцы не совпадают с ожидаемыми,
     # то это значит, что файл не подходит.
-    missing = [col for col in REQUIRED_COLS if col not in data.columns]
+    missing = get_missing_columns(data)
     if missing:
-        print(f"Не удалось прочесть файл: {file_path}. Отсутстуют обязательные столбцы: {', '.join(missing)}")
-        return None
+        return None, f"Не удалось прочесть файл: {file_path}. Отсутстуют обязательные столбцы: {', '.join(missing)}"
+
+    return drop_comma_quantities(data), None
+
 
+
+def load_sales_data(file_path):
+    data, error = read_sales_file(file_path)
+    if error is not None:
+        print(error)
     return data
 
 
 
-def preprocess_data(data):
-    # Если на вход пришёл None, то ничего не делаем, чтобы программа не падала
-    if data is None:
+def has_glob_pattern(path):
+    return any(char in path for char in "*?[")
+
+
+
+def resolve_sales_files(sources):
+    # Превращает источник данных в список файлов: путь к файлу, каталог (берутся все .csv),
+    # шаблон вида "data/*.csv" или список из всего перечисленного
+    if isinstance(sources, (list, tuple)):
+        return [path for source in sources for path in resolve_sales_files(source)]
+    if os.path.isdir(sources):
+        return sorted(glob.glob(os.path.join(sources, "*.csv")))
+    if has_glob_pattern(sources):
+        return sorted(glob.glob(sources))
+    return [sources]
+
+
+
+def is_multi_file_source(source):
+    # Каталог, шаблон или список — значит файлов может быть несколько
+    return isinstance(source, (list, tuple)) or os.path.isdir(source) or has_glob_pattern(source)
+
+
+
+def load_and_clean_file(file_path):
+    # Работа для отдельного процесса: прочитать, проверить и очистить один файл
+    data, error = read_sales_file(file_path)
+    if error is not None:
+        return file_path, None, 0, error
+    data_clean, removed = clean_sales_data(data)
+    return file_path, data_clean, removed, None
+
+
+
+@profiled
+def load_sales_files(sources, workers=None):
+    # Загружает и очищает несколько файлов, каждый в отдельном процессе, и объединяет результат.
+    # workers — число процессов (по умолчанию по числу ядер, но не больше числа файлов).
+    files = resolve_sales_files(sources)
+    if not files:
+        print(f"Не найдено ни одного файла с данными: {sources}")
         return None
 
-    # Работаем с копией, чтобы не менять исходные данные
-    data_clean = data.copy()
+    results = map_in_processes(load_and_clean_file, files, workers)
+
+    # Отчёт по файлам: какие загрузились, а какие нет и почему
+    loaded = [data_clean for _, data_clean, _, error in results if error is None]
+    errors = [error for _, _, _, error in results if error is not None]
+    removed = sum(result[2] for result in results)
+    print(f"Загружено файлов: {len(loaded)} из {len(files)}")
+    for error in errors:
+        print(f"  {error}")
+    if removed > 0:
+        print(f"Удалено строк с пустыми значениями: {removed}")
+
+    if not loaded:
+        return None
+    return combine_frames(loaded)
+
+
+
+class SalesReadError(Exception):
+    # Файл не удалось прочитать целиком. Бросается из iter_sales_chunks: уже отданные куски —
+    # только часть файла, и результат по ним выглядел бы полным, хотя им не является
+    pass
+
+
+
+def iter_sales_chunks(file_path, chunksize=DEFAULT_CHUNK_SIZE):
+    # Потоковое чтение большого файла: отдаёт уже очищенные куски по chunksize строк,
+    # поэтому в памяти одновременно находится только один кусок.
+    # Если файл не читается или обрывается на середине, бросает SalesReadError с понятным сообщением.
+    try:
+        encoding = detect_encoding(file_path)
+    except OSError:
+        raise SalesReadError(f"Не удалось прочесть файл, проверьте кодировку и разделитель: {file_path}")
+
+    rows_read = 0
+    removed = 0
+    columns = None
+    while True:
+        try:
+            # После смены кодировки продолжаем с первой строки, которую ещё не отдали,
+            # а столбцы называем так же, как они прочитались в исходной кодировке
+            reader = read_sales_csv(file_path, encoding, chunksize=chunksize, header=0, names=columns,
+                                    skiprows=range(1, rows_read + 1))
+            with reader:
+                for chunk in reader:
+                    # Структуру таблицы достаточно проверить на первом куске
+                    if columns is None:
+                        missing = get_missing_columns(chunk)
+                        if missing:
+                            raise SalesReadError(f"Не удалось прочесть файл: {file_path}. Отсутстуют обязательные столбцы: {', '.join(missing)}")
+                        columns = list(chunk.columns)
+
+                    rows_read += len(chunk)
+                    chunk_clean, chunk_removed = clean_sales_data(drop_comma_quantities(chunk))
+                    removed += chunk_removed
+                    yield chunk_clean
+            break
+        except UnicodeDecodeError:
+            if encoding == "cp1251":
+                raise SalesReadError(f"Не удалось дочитать файл, проверьте кодировку и разделитель: {file_path}")
+            # Начало файла оказалось в UTF-8, а дальше встретилась другая кодировка:
+            # как и read_sales_file, переходим на cp1251. Уже отданные куски прочитаны верно,
+            # поэтому файл дочитывается с того места, где прервался
+            encoding = "cp1251"
+        except SalesReadError:
+            raise
+        except Exception:
+            if rows_read == 0:
+                raise SalesReadError(f"Не удалось прочесть файл, проверьте кодировку и разделитель: {file_path}")
+            raise SalesReadError(f"Не удалось дочитать файл, проверьте кодировку и разделитель: {file_path}")
+
+    if removed > 0:
+        print(f"Удалено строк с пустыми значениями: {removed}")
+
+
+
+@profiled
+def parse_sales_dates(dates):
+    # Если первая дата записана как ДД.ММ.ГГГГ, разбираем весь столбец по этому формату:
+    # так делает и pd.to_datetime(dayfirst=True), угадывая формат по первому значению,
+    # но без угадывания. Одинаковые строки разбираются один раз (cache=True).
+    first = dates.dropna().head(1)
+    if len(first) > 0 and pd.to_datetime(first, format="%d.%m.%Y", errors="coerce").notna().all():
+        return pd.to_datetime(dates, format="%d.%m.%Y", errors="coerce", cache=True)
+    return pd.to_datetime(dates, errors="coerce", dayfirst=True)
+
+
+def sort_categories(values):
+    # Словарь категорий держим отсортированным, чтобы порядок групп совпадал с порядком строк
+    if values.cat.categories.is_monotonic_increasing:
+        return values
+    return values.cat.reorder_categories(values.cat.categories.sort_values())
+
+
+def to_kopecks(rubles):
+    # Рубли в целые копейки. У цены с двумя знаками после запятой ошибка разбора в float
+    # намного меньше половины копейки, поэтому округление даёт точное значение; более мелкие доли
+    # округляются до копейки
+    rubles = np.asarray(rubles)
+    if np.issubdtype(rubles.dtype, np.integer):
+        return rubles.astype(np.int64) * KOPECKS_PER_RUBLE
+    return np.rint(rubles * KOPECKS_PER_RUBLE).astype(np.int64)
+
+
+def to_rubles(kopecks):
+    # Копейки в рубли для готовых таблиц: одно деление точной целой суммы
+    return kopecks / KOPECKS_PER_RUBLE
+
+
+def categories_to_objects(table):
+    # Категории нужны только внутри расчётов: в готовых таблицах текстовые столбцы
+    # и индекс снова обычные строки (object), как до перехода на категории
+    for col in table.columns:
+        if isinstance(table[col].dtype, pd.CategoricalDtype):
+            table[col] = table[col].astype(object)
+    if isinstance(table.index, pd.CategoricalIndex):
+        table.index = table.index.astype(object)
+    return table
+
+
+@profiled
+def clean_sales_data(data):
+    # Исходную таблицу не меняем и целиком не копируем: столбцы, которые не удалось
+    # получить нужного типа при чтении, приводим отдельно, а затем берём только полные строки
+    converted = {}
 
     # Приводим дату к формату datetime,
     # ошибки превращаются в NaN и будут удалены позже
-    data_clean["Дата"] = pd.to_datetime(
-        data_clean["Дата"], errors="coerce", dayfirst=True
-    )
+    if not pd.api.types.is_datetime64_any_dtype(data["Дата"].dtype):
+        converted["Дата"] = parse_sales_dates(data["Дата"])
 
     # Количество упаковок делаем числом
-    data_clean["Количество упаковок, шт."] = pd.to_numeric(
-        data_clean["Количество упаковок, шт."], errors="coerce"
-    )
+    if not pd.api.types.is_numeric_dtype(data["Количество упаковок, шт."].dtype):
+        converted["Количество упаковок, шт."] = pd.to_numeric(
+            data["Количество упаковок, шт."], errors="coerce"
+        )
 
-    # Цена иногда может быть записана через запятую,
-    # поэтому сначала заменяем её на точку
-    data_clean["Цена руб./шт."] = (
-        data_clean["Цена руб./шт."].astype(str).str.replace(",", ".", regex=False)
-    )
-    data_clean["Цена руб./шт."] = pd.to_numeric(
-        data_clean["Цена руб./шт."], errors="coerce"
-    )
+    # Цена с десятичной запятой уже прочитана как число. Если в столбце встретилась точка
+    # или мусор, то сначала заменяем запятую на точку, как раньше
+    if not pd.api.types.is_numeric_dtype(data["Цена руб./шт."].dtype):
+        converted["Цена руб./шт."] = pd.to_numeric(
+            data["Цена руб./шт."].astype(str).str.replace(",", ".", regex=False), errors="coerce"
+        )
+
+    # Строковые столбцы переводим в категории (словарь отсортирован по алфавиту)
+    for col in CATEGORICAL_COLS:
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            converted[col] = sort_categories(data[col])
+        else:
+            converted[col] = data[col].astype("category")
 
     # Удаляем строки с пропусками
-    before = len(data_clean)
-    data_clean = data_clean.dropna()
-    removed = before - len(data_clean)
+    valid = np.ones(len(data), dtype=bool)
+    for col in data.columns:
+        valid &= converted.get(col, data[col]).notna().to_numpy()
+    rows = np.flatnonzero(valid)
+    removed = len(data) - len(rows)
+
+    data_clean = data.take(rows)
+    for col, values in converted.items():
+        data_clean[col] = values.iloc[rows].array
+
+    # Деньги дальше считаем в целых копейках: цену переводим сразу после разбора,
+    # а сумма операции — произведение целых чисел, поэтому все суммы по ней точные
+    position = data_clean.columns.get_loc("Цена руб./шт.")
+    prices = to_kopecks(data_clean.pop("Цена руб./шт.").to_numpy())
+    data_clean.insert(position, "Цена коп./шт.", prices)
+
+    amounts = data_clean["Количество упаковок, шт."].to_numpy() * prices
+    if not np.issubdtype(amounts.dtype, np.integer):
+        # Количество прочитано как дробное число — сумму округляем до копейки
+        amounts = np.rint(amounts).astype(np.int64)
+    data_clean["Сумма операции, коп."] = amounts
+
+    return data_clean, removed
+
+
+
+def preprocess_data(data):
+    # Если на вход пришёл None, то ничего не делаем, чтобы программа не падала
+    if data is None:
+        return None
+
+    data_clean, removed = clean_sales_data(data)
 
     if removed > 0:
         print(f"Удалено строк с пустыми значениями: {removed}")
 
-    # Считаем сумму операции
-    data_clean["Сумма операции"] = (
-        data_clean["Количество упаковок, шт."] * data_clean["Цена руб./шт."]
-    )
-
     return data_clean
 
 
 
-def get_operational_data(data_clean, operation_type=None):
+def get_operation_mask(operations, operation_types):
+    # Маска строк, у которых тип операции (без учёта регистра) входит в operation_types
+    operation_types = [operation_type.lower() for operation_type in operation_types]
+    if isinstance(operations.dtype, pd.CategoricalDtype):
+        # Регистр приводим только у словаря категорий, а строки сравниваем по целым кодам
+        categories = operations.cat.categories.str.lower()
+        codes = np.flatnonzero(categories.isin(operation_types))
+        return operations.cat.codes.isin(codes)
+    return operations.str.lower().isin(operation_types)
+
+
+
+def get_date_bounds(start=None, end=None):
+    # Границы диапазона дат в виде datetime64 (None — без ограничения)
+    start = None if start is None else pd.Timestamp(start).to_datetime64()
+    end = None if end is None else pd.Timestamp(end).to_datetime64()
+    return start, end
+
+
+
+def slice_dates(dates, start=None, end=None, offset=0):
+    # Срез отсортированного массива дат от start до end включительно, со сдвигом на offset
+    start, end = get_date_bounds(start, end)
+    lo = 0 if start is None else np.searchsorted(dates, start, side="left")
+    hi = len(dates) if end is None else np.searchsorted(dates, end, side="right")
+    return slice(offset + int(lo), offset + int(max(lo, hi)))
+
+
+
+def filter_dates(data, start=None, end=None):
+    # Строки таблицы за диапазон дат (включительно) полным просмотром столбца
+    start, end = get_date_bounds(start, end)
+    mask = np.ones(len(data), dtype=bool)
+    if start is not None:
+        mask &= (data['Дата'] >= start).to_numpy()
+    if end is not None:
+        mask &= (data['Дата'] <= end).to_numpy()
+    return data[mask]
+
+
+
+class SalesDataset:
+    # Очищенные данные, один раз разбитые по типу операции при загрузке.
+    # Строки отсортированы по типу операции, а внутри него по дате, поэтому каждая часть —
+    # это непрерывный срез общей таблицы, который отдаётся без копирования,
+    # а строки за любой диапазон дат находятся бинарным поиском.
+    # Добавленные строки (append) хранятся отдельными сегментами и вливаются в общую таблицу
+    # лениво, при первом обращении к строкам (data, partitions, get_operation). Само добавление
+    # стоит O(размер дельты): куб и итоги по товарам обновляются на дельту, и анализы по ним
+    # (выручка, прибыль, категории, топ, движение товаров) историю не перечитывают.
+    # Слияние — один проход O(N) на сколько угодно добавлений между обращениями к строкам.
+
+    @profiled
+    def __init__(self, data_clean, partitions=None):
+        # partitions — готовые границы частей {тип операции: (начало, конец)} для таблицы,
+        # которая уже отсортирована по типу операции и дате (например, открыта из кэша):
+        # тогда она берётся как есть, без сортировки и копирования
+        if partitions is not None:
+            self._data = data_clean
+            self._partitions = {name: slice(int(start), int(stop)) for name, (start, stop) in partitions.items()}
+        else:
+            # Типы операций без учёта регистра: "Продажа" и "продажа" попадают в одну часть
+            operation_keys = get_operation_keys(data_clean['Операция'])
+            row_groups = operation_keys.codes
+            names = operation_keys.categories
+
+            # lexsort устойчивая: строки с одинаковой датой сохраняют исходный порядок
+            order = np.lexsort((data_clean['Дата'].to_numpy(), row_groups))
+            self._data = data_clean.take(order)
+
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(row_groups, minlength=len(names)))])
+            self._partitions = {
+                name: slice(int(bounds[i]), int(bounds[i + 1])) for i, name in enumerate(names)
+            }
+        # Номер версии данных увеличивается при каждом добавлении строк
+        self.version = 0
+        # Добавленные, но ещё не влитые в общую таблицу наборы данных
+        self._segments = []
+        self._segments_lock = threading.Lock()
+        self._cube = None
+        self._turnover_sums = None
+        self._turnover_deltas = []
+        # Отсортированные массивы ID операций, от больших к меньшим
+        self._ids = None
+        self._dates = None
+        self._memo = OrderedDict()
+        self._memo_version = 0
+        self._memo_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data) + sum(len(segment._data) for segment in self._segments)
+
+    @property
+    def data(self):
+        # Все строки, отсортированные по типу операции и дате
+        self.merge_segments()
+        return self._data
+
+    @property
+    def partitions(self):
+        # Границы частей {тип операции: срез строк}
+        self.merge_segments()
+        return self._partitions
+
+    @profiled
+    def merge_segments(self):
+        # Вливает добавленные сегменты в общую таблицу: новые строки каждого типа операции
+        # дописываются в конец своей части, и только части, куда пришли даты задним числом,
+        # досортировываются по дате (строки с одинаковой датой остаются в порядке добавления)
+        with self._segments_lock:
+            if not self._segments:
+                return
+            sources = [self] + self._segments
+            names = []
+            for source in sources:
+                names += [name for name in source._partitions if name not in names]
+
+            frames = []
+            bounds = [0]
+            unsorted = []
+            for name in names:
+                parts = [source._data.iloc[source._partitions[name]] for source in sources if name in source._partitions]
+                frames.extend(parts)
+                bounds.append(bounds[-1] + sum(len(part) for part in parts))
+                # Каждая часть уже отсортирована по дате; если каждая следующая начинается
+                # не раньше конца предыдущей, вся часть останется отсортированной
+                filled = [part for part in parts if len(part) > 0]
+                if any(later['Дата'].iloc[0] < earlier['Дата'].iloc[-1] for earlier, later in zip(filled, filled[1:])):
+                    unsorted.append(slice(bounds[-2], bounds[-1]))
+            data = combine_frames(frames)
+
+            # Дельта задним числом: досортировываем по дате только затронутые части
+            if unsorted:
+                order = np.arange(len(data))
+                dates = data['Дата'].to_numpy()
+                for part in unsorted:
+                    order[part] = part.start + np.argsort(dates[part], kind="stable")
+                data = data.take(order).reset_index(drop=True)
+
+            self._data = data
+            self._partitions = {name: slice(bounds[i], bounds[i + 1]) for i, name in enumerate(names)}
+            self._segments = []
+
+    def get_operation(self, operation_type, start=None, end=None):
+        # Срез строк одного типа операции (без учёта регистра), без копирования.
+        # start и end (включительно) ограничивают даты; границы ищутся бинарным поиском.
+        part = self.partitions.get(operation_type.lower(), slice(0, 0))
+        if start is not None or end is not None:
+            part = slice_dates(self.data['Дата'].to_numpy()[part], start, end, part.start)
+        return self.data.iloc[part]
+
+    @property
+    def dates(self):
+        # Отсортированные уникальные даты операций
+        if self._dates is None:
+            self._dates = np.unique(self.data['Дата'].to_numpy())
+        return self._dates
+
+    def has_date(self, value):
+        # Есть ли операции за дату в формате ГГГГ-ММ-ДД
+        try:
+            date = pd.to_datetime(value, format="%Y-%m-%d").to_datetime64()
+        except (ValueError, TypeError):
+            return False
+        position = np.searchsorted(self.dates, date)
+        return position < len(self.dates) and self.dates[position] == date
+
+    @property
+    def cube(self):
+        # Дневной куб строится один раз, при первом обращении
+        if self._cube is None:
+            self._cube = DailyCube(self)
+        return self._cube
+
+    @property
+    def turnover_sums(self):
+        # Итоги по товарам для анализа движения, считаются один раз.
+        # Итоги добавленных дельт складываются с ними при первом обращении после добавления
+        if self._turnover_sums is None:
+            self._turnover_sums = get_turnover_sums(self.data)
+        elif self._turnover_deltas:
+            self._turnover_sums = merge_sums(
+                [self._turnover_sums] + self._turnover_deltas, self._turnover_sums.index.names)
+            self._turnover_deltas = []
+        return self._turnover_sums
+
+    def memoize(self, key, compute):
+        # Результат анализа по ключу: из памяти, если он уже считался для текущей версии данных,
+        # иначе считается и запоминается. Хранятся MEMO_SIZE последних результатов (LRU).
+        with self._memo_lock:
+            if self._memo_version != self.version:
+                # Данные изменились (append) — старые результаты больше не верны
+                self._memo.clear()
+                self._memo_version = self.version
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+
+        result = compute()
+        with self._memo_lock:
+            if self._memo_version == self.version:
+                self._memo[key] = result
+                while len(self._memo) > MEMO_SIZE:
+                    self._memo.popitem(last=False)
+        return result
+
+    def get_operations(self, operation_types, exclude=False):
+        # Строки, у которых тип операции в нижнем регистре входит (или не входит) в operation_types
+        parts = [
+            self.data.iloc[part] for name, part in self.partitions.items()
+            if (name in operation_types) != exclude
+        ]
+        if not parts:
+            return self.data.iloc[0:0]
+        return parts[0] if len(parts) == 1 else pd.concat(parts)
+
+    @profiled
+    def append(self, delta_clean):
+        # Добавляет новые очищенные строки и обновляет куб и итоги по товарам
+        # только на величину добавленных данных, без пересчёта всей истории.
+        # Возвращает число добавленных строк.
+        delta_clean = delta_clean.drop_duplicates('ID операции')
+
+        # Отбрасываем операции, которые уже есть в наборе данных (бинарный поиск в отсортированных ID).
+        # ID всей истории сортируются один раз, при первом добавлении
+        if self._ids is None:
+            self._ids = [np.sort(self.data['ID операции'].to_numpy())]
+        delta_clean = delta_clean[~is_known_id(self._ids, delta_clean['ID операции'].to_numpy())]
+        if len(delta_clean) == 0:
+            return 0
+
+        delta = SalesDataset(delta_clean)
+        with self._segments_lock:
+            self._segments.append(delta)
+
+        # Обновляем поддерживаемые агрегаты, если они уже были посчитаны
+        if self._cube is not None:
+            self._cube.extend(delta.cube)
+        if self._turnover_sums is not None:
+            self._turnover_deltas.append(delta.turnover_sums)
+        if self._dates is not None:
+            self._dates = np.union1d(self._dates, delta.dates)
+
+        # ID новых операций — отдельный отсортированный массив. Когда он не меньше предыдущего,
+        # их сливаем: массивов остаётся O(log N), и каждый ID пересортировывается O(log N) раз
+        self._ids.append(np.sort(delta_clean['ID операции'].to_numpy()))
+        while len(self._ids) > 1 and len(self._ids[-1]) >= len(self._ids[-2]):
+            newest = self._ids.pop()
+            self._ids[-1] = np.sort(np.concatenate([self._ids[-1], newest]))
+
+        self.version += 1
+        return len(delta_clean)
+
+
+
+def is_known_id(id_arrays, ids):
+    # Маска ids, которые уже есть в одном из отсортированных массивов id_arrays
+    known = np.zeros(len(ids), dtype=bool)
+    for sorted_ids in id_arrays:
+        if len(sorted_ids) == 0:
+            continue
+        positions = np.searchsorted(sorted_ids, ids).clip(max=len(sorted_ids) - 1)
+        known |= sorted_ids[positions] == ids
+    return known
+
+
+
+def append_sales_data(dataset, file_path):
+    # Загружает файл с новыми операциями (дельту) и добавляет его в SalesDataset.
+    # Возвращает число добавленных строк или None, если файл не удалось прочитать.
+    delta_clean = preprocess_data(load_sales_data(file_path))
+    if delta_clean is None:
+        return None
+    return dataset.append(delta_clean)
+
+
+
+@profiled
+def combine_frames(frames):
+    # Склеивает таблицы с одинаковыми столбцами. Словари категорий объединяются
+    # (и остаются отсортированными), поэтому категориальные столбцы не превращаются в строки.
+    frames = list(frames)
+    for col in frames[0].columns:
+        dtypes = [frame[col].dtype for frame in frames]
+        if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        if all(dtype == dtypes[0] for dtype in dtypes):
+            continue
+        categories = pd.Index(sorted(set().union(*[dtype.categories for dtype in dtypes])))
+        frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+
+def merge_sums(parts, keys):
+    # Складывает частичные итоги, сгруппированные по одинаковым ключам
+    combined = combine_frames([part.reset_index() for part in parts])
+    return combined.groupby(keys, observed=True).sum()
+
+
+
+class DailyCube:
+    # Дневные итоги по количеству и сумме для каждой комбинации
+    # дата × магазин × артикул (с названием и отделом) отдельно для каждого типа операции.
+    # Все анализы по периодам и топы считаются по кубу, а не по исходным транзакциям.
+
+    KEYS = ['Дата', 'Адрес магазина', 'Артикул', 'Название товара', 'Отдел товара']
+    VALUES = ['Количество упаковок, шт.', 'Сумма операции, коп.']
+
+    @profiled
+    def __init__(self, dataset):
+        self.parts = {}
+        for name in dataset.partitions:
+            part = dataset.get_operation(name)
+            self.parts[name] = part.groupby(self.KEYS, observed=True)[self.VALUES].sum().reset_index()
+        # Части добавленных данных, которые ещё не влиты в parts
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._daily = {}
+
+    def extend(self, other):
+        # Добавляет куб новых данных. Части нового куба откладываются и вливаются
+        # при первом обращении к части (get_part), дневные итоги обновляются сразу — их немного
+        for name, part in other.parts.items():
+            if name not in self.parts:
+                self.parts[name] = part
+            else:
+                with self._pending_lock:
+                    self._pending.setdefault(name, []).append(part)
+
+            if name in self._daily:
+                self._daily[name] = pd.concat(
+                    [self._daily[name], other.get_daily_totals(name)]).groupby(level=0).sum()
+
+    def merge_parts(self, parts):
+        # Сливает части куба одного типа операции. Если даты каждой следующей части идут после
+        # предыдущей (обычный случай для ежедневных выгрузок), строки просто дописываются в конец,
+        # иначе совпадающие ключи складываются
+        filled = [part for part in parts if len(part) > 0]
+        if len(filled) <= 1:
+            return filled[0] if filled else parts[0]
+        combined = combine_frames(filled)
+        if all(later['Дата'].min() > earlier['Дата'].max() for earlier, later in zip(filled, filled[1:])):
+            return combined
+        # Части куба — обычные таблицы с RangeIndex, складываем их строки напрямую
+        return combined.groupby(self.KEYS, observed=True)[self.VALUES].sum().reset_index()
+
+    def get_part(self, operation_type, start=None, end=None):
+        # Куб одного типа операции (без учёта регистра). Строки куба отсортированы по дате,
+        # поэтому диапазон дат start..end (включительно) берётся срезом
+        name = operation_type.lower()
+        if name in self._pending:
+            with self._pending_lock:
+                if name in self._pending:
+                    self.parts[name] = self.merge_parts([self.parts[name]] + self._pending.pop(name))
+        part = self.parts.get(name)
+        if part is None:
+            return pd.DataFrame(columns=self.KEYS + self.VALUES)
+        if start is not None or end is not None:
+            part = part.iloc[slice_dates(part['Дата'].to_numpy(), start, end)]
+        return part
+
+    def get_daily_totals(self, operation_type):
+        # Итоги по дням для одного типа операции, считаются один раз
+        name = operation_type.lower()
+        if name not in self._daily:
+            self._daily[name] = self.get_part(name).groupby('Дата')[self.VALUES].sum()
+        return self._daily[name]
+
+    @profiled
+    def rollup(self, operation_types, period='D', exclude=False, start=None, end=None):
+        # Итоги по периодам для строк, у которых тип операции в нижнем регистре входит
+        # (или при exclude=True не входит) в operation_types, за даты start..end (включительно).
+        # Недели и месяцы сворачиваются из дневных итогов, поэтому транзакции повторно не просматриваются.
+        # Как и pd.Grouper, заполняет нулями периоды без операций.
+        daily = [
+            self.get_daily_totals(name) for name in self.parts
+            if (name in operation_types) != exclude
+        ]
+        if start is not None or end is not None:
+            daily = [totals.iloc[slice_dates(totals.index.to_numpy(), start, end)] for totals in daily]
+            daily = [totals for totals in daily if len(totals) > 0]
+        if not daily:
+            return None
+        totals = daily[0]
+        for other in daily[1:]:
+            totals = totals.add(other, fill_value=0)
+        return totals.resample(get_period_freq(period)).sum()
+
+
+
+# Ключи частичных агрегатов для файлов, которые не помещаются в память: все анализы —
+# это суммы по подмножеству этих ключей (или число различных артикулов в отделе),
+# поэтому по агрегатам они дают тот же результат, что и по исходным строкам
+AGGREGATE_KEYS = ['Операция'] + DailyCube.KEYS
+
+
+@profiled
+def aggregate_chunk(chunk):
+    # Частичный агрегат одного куска: суммы количества и суммы операции по ключам
+    return chunk.groupby(AGGREGATE_KEYS, observed=True)[DailyCube.VALUES].sum()
+
+
+
+@profiled
+def fold_sales_chunks(file_path, chunksize=DEFAULT_CHUNK_SIZE):
+    # Читает файл кусками по chunksize строк и сворачивает их в агрегаты, не загружая файл целиком.
+    # Возвращает SalesDataset, строки которого — итоги по (операция, дата, магазин, товар),
+    # или None, если файл не удалось прочитать. По нему все функции анализа
+    # (выручка и прибыль по периодам, категории, топ-N, движение товаров) дают те же таблицы,
+    # что и по полным данным; число различных артикулов в отделе сохраняется, потому что
+    # каждая пара (отдел, артикул) остаётся в агрегатах.
+    # Память ограничена размером куска и числом групп, а не числом строк в файле.
+    folded = None
+    pending = []
+    pending_rows = 0
+    try:
+        for chunk in iter_sales_chunks(file_path, chunksize):
+            part = aggregate_chunk(chunk)
+            pending.append(part)
+            pending_rows += len(part)
+            # Накопленные частичные агрегаты сливаем, когда их набирается на кусок и не меньше,
+            # чем уже свёрнуто: так каждая строка агрегатов пересчитывается O(log) раз, а не на каждом куске
+            if pending_rows >= max(chunksize, 0 if folded is None else len(folded)):
+                folded = merge_sums(pending if folded is None else [folded] + pending, AGGREGATE_KEYS)
+                pending = []
+                pending_rows = 0
+    except SalesReadError as e:
+        # Агрегаты по части файла выглядели бы как полный результат
+        print(e)
+        return None
+
+    if pending:
+        folded = merge_sums(pending if folded is None else [folded] + pending, AGGREGATE_KEYS)
+    if folded is None:
+        return None
+    return SalesDataset(folded.reset_index())
+
+
+
+def normalize_argument(name, value):
+    # Одинаковые по смыслу аргументы дают один ключ: '2021-06-01' и Timestamp('2021-06-01') — одна дата
+    if name in ('start', 'end', 'date') and value is not None and value != 'all':
+        return pd.Timestamp(value)
+    return value
+
+
+
+def memoized(func):
+    # Запоминает результаты функции анализа для SalesDataset. Ключ — версия данных (см. SalesDataset.memoize),
+    # имя функции и нормализованные аргументы со значениями по умолчанию.
+    # Обычные DataFrame не запоминаются: у них нет версии, и их можно менять на месте.
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(data_clean, *args, **kwargs):
+        if not isinstance(data_clean, SalesDataset):
+            return func(data_clean, *args, **kwargs)
+        bound = signature.bind(data_clean, *args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__,) + tuple(
+            (name, normalize_argument(name, value)) for name, value in list(bound.arguments.items())[1:])
+        try:
+            hash(key)
+        except (TypeError, ValueError):
+            return func(data_clean, *args, **kwargs)
+        result = data_clean.memoize(key, lambda: func(data_clean, *args, **kwargs))
+        # Отдаём копию, чтобы изменения у вызывающего кода не испортили запомненный результат
+        return copy_result(result)
+
+    return wrapper
+
+
+
+def copy_result(result):
+    # Копия результата анализа: таблицы, ряды и массивы копируются, в том числе внутри кортежей
+    if isinstance(result, tuple):
+        return tuple(copy_result(item) for item in result)
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return result.copy()
+    return result
+
+
+
+def get_period_freq(period):
+    # Неделя заканчивается в понедельник, дни и месяцы передаются как есть
+    return 'W-MON' if period == 'W' else period
+
+
+
+@profiled
+def sum_by_period(data, period):
+    # Суммы операций по периодам для уже отфильтрованной таблицы
+    return data.groupby(pd.Grouper(key='Дата', freq=get_period_freq(period)))['Сумма операции, коп.'].sum()
+
+
+
+@profiled
+def select_operations(data_clean, operation_types, exclude=False):
+    # Строки, у которых тип операции в нижнем регистре входит (или не входит) в operation_types
+    if isinstance(data_clean, SalesDataset):
+        return data_clean.get_operations(operation_types, exclude)
+    mask = data_clean['Операция'].str.lower().isin(operation_types)
+    return data_clean[~mask if exclude else mask].copy()
+
+
+
+@profiled
+def get_operational_data(data_clean, operation_type=None, start=None, end=None):
+    # start и end (включительно) дополнительно ограничивают диапазон дат
+
+    # Для SalesDataset части уже подготовлены при загрузке, отдаём их без фильтрации и копирования
+    if isinstance(data_clean, SalesDataset):
+        if operation_type is None:
+            return filter_dates(data_clean.data, start, end)
+        return data_clean.get_operation(operation_type, start, end)
+
     if operation_type is None: # Если тип операции не указан, возвращаем датасет
-        return data_clean.copy()
+        return filter_dates(data_clean, start, end).copy()
     
-    operation_type_lower = operation_type.lower() # Приводим всё к нижнему регистру для упрощения сравнения
-    filtered_data = data_clean[data_clean['Операция'].str.lower() == operation_type_lower].copy() # Фильтруем данные по указанному типу операции
+    # Сравнение идёт без учёта регистра
+    filtered_data = data_clean[get_operation_mask(data_clean['Операция'], [operation_type])].copy() # Фильтруем данные по указанному типу операции
+    if start is not None or end is not None:
+        filtered_data = filter_dates(filtered_data, start, end)
     
     return filtered_data
 
 
 
-def calculate_revenue_by_period(data_clean, period='D'):
-    sales_data = get_operational_data(data_clean, operation_type="Продажа") # Получаем данные по продажам
-        
-    if period == 'W': # Группируем по периоду(неделе)
-        revenue_by_period = sales_data.groupby(pd.Grouper(key='Дата', freq='W-MON'))['Сумма операции'].sum().reset_index()# Группируем по понедельнику
-        revenue_by_period.columns = ['Дата', 'Выручка по периоду']
+@profiled
+@memoized
+def calculate_revenue_by_period(data_clean, period='D', start=None, end=None):
+    # start и end (включительно) ограничивают диапазон дат, по умолчанию берётся весь период
+    if isinstance(data_clean, SalesDataset):
+        # Берём готовые дневные итоги из куба и сворачиваем их до нужного периода
+        totals = data_clean.cube.rollup(["продажа"], period, start=start, end=end)
+        if totals is None:
+            totals = sum_by_period(data_clean.get_operation("Продажа", start, end), period)
+        else:
+            totals = totals['Сумма операции, коп.']
     else:
-        revenue_by_period = sales_data.groupby(pd.Grouper(key='Дата', freq=period))['Сумма операции'].sum().reset_index()# Для группировки по дням и месяцам
-        revenue_by_period.columns = ['Дата', 'Выручка по периоду'] 
+        sales_data = get_operational_data(data_clean, "Продажа", start, end) # Получаем данные по продажам
+        totals = sum_by_period(sales_data, period) # Группируем по дням, неделям (по понедельнику) или месяцам
+
+    return build_revenue_table(totals)
+
+
+
+def build_revenue_table(totals):
+    # Таблица выручки из сумм продаж по периодам (в копейках, индекс — дата периода)
+    revenue_by_period = totals.reset_index()
+    revenue_by_period.columns = ['Дата', 'Выручка по периоду']
+    revenue_by_period['Выручка по периоду'] = to_rubles(revenue_by_period['Выручка по периоду'])
         
     revenue_by_period = revenue_by_period.sort_values('Дата')# Сортируем по возрастанию даты
     revenue_by_period = revenue_by_period.reset_index(drop=True)# Ресет индексов
@@ -109,35 +931,64 @@ def calculate_revenue_by_period(data_clean, period='D'):
 
 
 
-def calculate_profit_by_period(data_clean, period='D'):
+@profiled
+def calculate_profit_by_period(data_clean, period='D', start=None, end=None):
+    # start и end (включительно) ограничивают диапазон дат, по умолчанию берётся весь период.
+    # Предупреждения печатаются здесь, вне запоминаемого расчёта, поэтому повторяются при каждом вызове
+    sums = sum_profit_by_period(data_clean, period, start, end)
+    if sums is None:
+        print("Нет данных о продажах для расчета доходов")
+        return None
+    return build_profit_table(*sums)
+
+
+
+@memoized
+def sum_profit_by_period(data_clean, period='D', start=None, end=None):
+    # Доходы и расходы (в копейках) по периодам для расчёта прибыли; None, если продаж нет
+
     # Доходы от продаж
-    sales_data = get_operational_data(data_clean, operation_type="Продажа")
+    if isinstance(data_clean, SalesDataset):
+        # Для SalesDataset продажи проверяются по дневным итогам из куба, строки не перечитываются
+        sales_data = income_by_period = data_clean.cube.rollup(["продажа"], period, start=start, end=end)
+    else:
+        sales_data = get_operational_data(data_clean, "Продажа", start, end)
     if sales_data is None or len(sales_data) == 0:
-        print("Нет данных о продажах для расчета доходов")
         return None
     
     # Определяем какие операции считать расходами
-    expense_operations = ["Поступление"]
-    
-    if expense_operations:
-        expense_data = data_clean[data_clean['Операция'].str.lower().isin(expense_operations)].copy()
-    else:
-        # Альтернативная логика: все что не продажа - расход
-        expense_data = data_clean[data_clean['Операция'].str.lower() != "продажа"].copy()
+    expense_operations, expense_exclude = get_expense_operations()
     
-    # Группировка доходов по периоду
-    if period == 'W':
-        income_by_period = sales_data.groupby(pd.Grouper(key='Дата', freq='W-MON'))['Сумма операции'].sum()
-    else:
-        income_by_period = sales_data.groupby(pd.Grouper(key='Дата', freq=period))['Сумма операции'].sum()
-    
-    # Группировка расходов по периоду
-    if len(expense_data) > 0:
-        if period == 'W':
-            expense_by_period = expense_data.groupby(pd.Grouper(key='Дата', freq='W-MON'))['Сумма операции'].sum()
-        else:
-            expense_by_period = expense_data.groupby(pd.Grouper(key='Дата', freq=period))['Сумма операции'].sum()
+    # Группировка доходов и расходов по периоду
+    if isinstance(data_clean, SalesDataset):
+        # Для SalesDataset сворачиваем готовые дневные итоги из куба
+        income_by_period = income_by_period['Сумма операции, коп.']
+        expense_by_period = data_clean.cube.rollup(expense_operations, period, expense_exclude, start, end)
+        if expense_by_period is not None:
+            expense_by_period = expense_by_period['Сумма операции, коп.']
     else:
+        expense_data = filter_dates(select_operations(data_clean, expense_operations, expense_exclude), start, end)
+        income_by_period = sum_by_period(sales_data, period)
+        expense_by_period = sum_by_period(expense_data, period) if len(expense_data) > 0 else None
+
+    return income_by_period, expense_by_period
+
+
+
+def get_expense_operations():
+    # Какие операции считать расходами: список типов операций и признак «все, кроме них»
+    expense_operations = ["Поступление"]
+    # Альтернативная логика (если список пуст): все что не продажа - расход
+    expense_exclude = not expense_operations
+    if expense_exclude:
+        expense_operations = ["продажа"]
+    return expense_operations, expense_exclude
+
+
+
+def build_profit_table(income_by_period, expense_by_period):
+    # Таблица прибыли из сумм доходов и расходов по периодам (в копейках, индекс — дата периода)
+    if expense_by_period is None:
         # Если нет данных о расходах, считаем расходы = 0
         expense_by_period = pd.Series(0, index=income_by_period.index)
         print("Внимание: данные о расходах не найдены. Прибыль рассчитывается как выручка.")
@@ -148,8 +999,8 @@ def calculate_profit_by_period(data_clean, period='D'):
         'Расходы': expense_by_period
     }).fillna(0)
     
-    # Рассчитываем прибыль
-    profit_data['Прибыль по периоду'] = profit_data['Доходы'] - profit_data['Расходы']
+    # Рассчитываем прибыль: разность в копейках точная, в рубли переводим только результат
+    profit_data['Прибыль по периоду'] = to_rubles(profit_data['Доходы'] - profit_data['Расходы'])
     
     # Создаем итоговый датафрейм
     profit_result = profit_data[['Прибыль по периоду']].reset_index()
@@ -160,35 +1011,47 @@ def calculate_profit_by_period(data_clean, period='D'):
 
 
 
+@profiled
+@memoized
 def aggregate_sales_by_category(data_clean):
     # Фильтруем продажи (если есть колонка операции)
-    sales_data = get_operational_data(data_clean, operation_type="Продажа")
+    if isinstance(data_clean, SalesDataset):
+        # Дневные итоги продаж из куба: суммы те же, а каждая пара (отдел, артикул) в нём сохраняется
+        sales_data = data_clean.cube.get_part("Продажа")
+    else:
+        sales_data = get_operational_data(data_clean, operation_type="Продажа")
     
     # Группируем по категориям
     agg_dict = {}
-    if 'Сумма операции' in sales_data.columns:
-        agg_dict['Выручка'] = ('Сумма операции', 'sum')
+    if 'Сумма операции, коп.' in sales_data.columns:
+        agg_dict['Выручка'] = ('Сумма операции, коп.', 'sum')
     if 'Количество упаковок, шт.' in sales_data.columns:
         agg_dict['Проданных единиц'] = ('Количество упаковок, шт.', 'sum')
     if 'Артикул' in sales_data.columns:
         agg_dict['Уникальных товаров'] = ('Артикул', 'nunique')
     
-    sales_by_category = sales_data.groupby('Отдел товара').agg(**agg_dict)
+    sales_by_category = sales_data.groupby('Отдел товара', observed=True).agg(**agg_dict)
     
+    if 'Выручка' in sales_by_category.columns:
+        sales_by_category['Выручка'] = to_rubles(sales_by_category['Выручка'])
+
     # Сортируем по алфавиту
     category_stats = sales_by_category.sort_index()
     
-    return category_stats
+    return categories_to_objects(category_stats)
 
 
 
-def get_top_n_products(data_clean, n=5, metric='quantity', date='all'):
-    # Оставляем только операции продажи
-    sales_data = get_operational_data(data_clean, "Продажа")
+def group_product_sales(data_clean, metric='quantity', start=None, end=None, by=None):
+    # Продажи по товарам (в каждой группе by, если она задана) за даты start..end.
+    # Возвращает таблицу и имя столбца с суммой или None для неизвестной метрики
 
-    # Если указана конкретная дата, переназначаем ее
-    if date != 'all':
-        sales_data = sales_data[sales_data["Дата"] == date]
+    # Оставляем только операции продажи
+    if isinstance(data_clean, SalesDataset):
+        # Берём дневные итоги продаж из куба вместо отдельных транзакций, диапазон дат — срезом
+        sales_data = data_clean.cube.get_part("Продажа", start, end)
+    else:
+        sales_data = get_operational_data(data_clean, "Продажа", start, end)
 
     # Обозначаем переменные для фильтрации в зависимости от указанной метрики
     if metric == 'quantity':
@@ -196,95 +1059,170 @@ def get_top_n_products(data_clean, n=5, metric='quantity', date='all'):
         result_column = f'Сумма_{agg_column}'   # Название нового столбца в датафрейме
         agg_func = 'sum'  # Параметр агрегирования - сумма
     elif metric == 'revenue':
-        agg_column = 'Сумма операции'
-        result_column = f'Сумма_{agg_column}'
+        agg_column = 'Сумма операции, коп.'
+        result_column = 'Сумма_Сумма операции'  # Сумма в рублях
         agg_func = 'sum'
     else:
         return None
         
     # Группируем все записи для одинаковых названия товаров в одну строчку - сумма по товару, считаю сумму всех операций
-    grouped_data = sales_data.groupby('Название товара', as_index=False).agg({agg_column: agg_func}).rename(columns={agg_column: result_column})
+    group_cols = ['Название товара'] if by is None else [by, 'Название товара']
+    grouped_data = sales_data.groupby(group_cols, as_index=False, observed=True).agg({agg_column: agg_func}).rename(columns={agg_column: result_column})
+    if metric == 'revenue':
+        grouped_data[result_column] = to_rubles(grouped_data[result_column])
+    return categories_to_objects(grouped_data), result_column
 
-    # Сортировка по колонке по убыванию
-    data_sorted = grouped_data.sort_values(by=result_column, ascending=False)
-    return data_sorted.head(n).reset_index(drop=True)
 
 
+@profiled
+@memoized
+def rank_products(data_clean, metric='quantity', start=None, end=None, by=None):
+    # Полный рейтинг товаров (внутри каждой группы by) и место каждой строки в своей группе.
+    # Порядок тот же, что у топа: по убыванию, при равенстве — по порядку групп,
+    # поэтому топ любого размера n — это строки с местом меньше n
+    grouped = group_product_sales(data_clean, metric, start, end, by)
+    if grouped is None:
+        return None
+    grouped_data, result_column = grouped
+    values = grouped_data[result_column].to_numpy()
+    if by is None:
+        order = select_top_positions(values, len(values))
+        ranks = np.arange(len(order))
+    else:
+        group_codes = pd.factorize(grouped_data[by])[0]
+        order = select_top_per_group(group_codes, values, len(values))
+        ranks = get_group_ranks(group_codes[order])
+    return grouped_data.iloc[order].reset_index(drop=True), ranks
+
+
+
+@profiled
+def get_top_n_products(data_clean, n=5, metric='quantity', date='all', start=None, end=None, by=None):
+    # Если указана конкретная дата, топ строится за неё,
+    # иначе за диапазон start..end (включительно, по умолчанию — весь период).
+    # by — столбец группы (например, 'Отдел товара' или 'Адрес магазина'): тогда топ n строится в каждой группе
+    if date != 'all':
+        start = end = date
 
+    if isinstance(data_clean, SalesDataset):
+        # Полный рейтинг запоминается, поэтому повторный запрос с другим n не пересчитывает продажи
+        ranking = rank_products(data_clean, metric, start, end, by)
+        if ranking is None:
+            return None
+        ranked, ranks = ranking
+        return ranked[ranks < n].reset_index(drop=True)
+
+    grouped = group_product_sales(data_clean, metric, start, end, by)
+    if grouped is None:
+        return None
+    grouped_data, result_column = grouped
+
+    # Выбираем n лучших по убыванию без сортировки всей таблицы
+    if by is None:
+        top = select_top_positions(grouped_data[result_column].to_numpy(), n)
+    else:
+        # Группы уже идут по порядку, поэтому коды из factorize тоже упорядочены
+        group_codes = pd.factorize(grouped_data[by])[0]
+        top = select_top_per_group(group_codes, grouped_data[result_column].to_numpy(), n)
+    return grouped_data.iloc[top].reset_index(drop=True)
+
+
+
+def get_operation_keys(operations):
+    # Тип операции каждой строки в нижнем регистре в виде категории.
+    # Регистр приводится только у словаря категорий, а не у каждой строки.
+    if not isinstance(operations.dtype, pd.CategoricalDtype):
+        operations = operations.astype("category")
+    group_of_category, names = pd.factorize(operations.cat.categories.str.lower())
+    codes = operations.cat.codes.to_numpy()
+    row_codes = np.where(codes >= 0, group_of_category[codes], -1)
+    return pd.Categorical.from_codes(row_codes, names)
+
+
+
+@profiled
+def get_turnover_sums(data):
+    # Одна группировка по артикулу и типу операции сразу для продаж и поступлений,
+    # остальные типы операций превращаются в пропуски и отбрасываются группировкой
+    value_cols = ['Количество упаковок, шт.', 'Сумма операции, коп.']
+    operation_keys = pd.Series(get_operation_keys(data['Операция']), index=data.index, name='Операция')
+    operation_keys = operation_keys.where(operation_keys.isin(['продажа', 'поступление']))
+    return data.groupby([data['Артикул'], data['Название товара'], operation_keys], observed=True)[value_cols].sum()
+
+
+
+@profiled
+@memoized
 def analyze_inventory_turnover(data_clean, top_n=10):
-    # Сохраняем два датасета по продажам и поступлениям отдельно
-    sales_data = get_operational_data(data_clean, 'Продажа')
-    purchases_data = get_operational_data(data_clean, 'Поступление')
-
-    # Группируем все продажи по одному товары по сумме количества проданных упаковок и выручке
-    sales_grouped = sales_data.groupby(['Артикул', 'Название товара']).agg({
-        'Количество упаковок, шт.': 'sum',
-        'Сумма операции': 'sum'}).reset_index()
-    # Переименуем столбцы для ясности
-    sales_grouped = sales_grouped.rename(columns={
-        'Количество упаковок, шт.': 'Продано_упаковок',
-        'Сумма операции': 'Выручка_от_продаж'})
-    
-    # То же самое для закупок
-    purchases_grouped = purchases_data.groupby(['Артикул', 'Название товара']).agg({
-        'Количество упаковок, шт.': 'sum',
-        'Сумма операции': 'sum'}).reset_index()
-    purchases_grouped = purchases_grouped.rename(columns={
-        'Количество упаковок, шт.': 'Поступлено_упаковок',
-        'Сумма операции': 'Затраты_на_закупки'})
-    
-    # При помощи merge объединяем два датафрейма по артикулу
-    inventory_analysis = pd.merge(
-        sales_grouped,
-        purchases_grouped,
-        on=['Артикул', 'Название товара'],
-        how='outer')  # Используем outer join для отображения всех товаров
-    
-    # В случае, если товар был только в продажах или в поступлениях, заменяем NaN значения на 0
-    inventory_analysis['Продано_упаковок'] = inventory_analysis['Продано_упаковок'].fillna(0)
-    inventory_analysis['Выручка_от_продаж'] = inventory_analysis['Выручка_от_продаж'].fillna(0)
-    inventory_analysis['Поступлено_упаковок'] = inventory_analysis['Поступлено_упаковок'].fillna(0)
-    inventory_analysis['Затраты_на_закупки'] = inventory_analysis['Затраты_на_закупки'].fillna(0)
+    if isinstance(data_clean, SalesDataset):
+        grouped = data_clean.turnover_sums
+    else:
+        grouped = get_turnover_sums(data_clean)
+    # Разворачиваем типы операций в столбцы: строка на товар, как после outer merge
+    wide = grouped.unstack(-1)
+
+    def get_column(value_col, operation_type):
+        if (value_col, operation_type) in wide.columns:
+            column = wide[(value_col, operation_type)]
+        else:
+            column = pd.Series(np.nan, index=wide.index)
+        # Столбец без пропусков сохраняет исходный тип, как и при merge
+        if column.notna().all():
+            column = column.astype(grouped[value_col].dtype)
+        # В случае, если товар был только в продажах или в поступлениях, заменяем NaN значения на 0
+        return column.fillna(0)
+
+    sold = get_column('Количество упаковок, шт.', 'продажа')
+    received = get_column('Количество упаковок, шт.', 'поступление')
 
     # Рассчитываем разницу между продажами и поступлениями
-    inventory_analysis['Разница_упаковок'] = (
-        inventory_analysis['Продано_упаковок'] - inventory_analysis['Поступлено_упаковок'])
-    
+    difference = sold - received
+    # Выбираем top_n товаров по абсолютному значению разницы (по убыванию) без сортировки всей таблицы
+    top = select_top_positions(difference.abs().to_numpy(), top_n)
+
+    keys = wide.index[top].to_frame(index=False)
+    keys.columns = ['Артикул', 'Название товара']
+    return build_inventory_table(
+        keys,
+        sold.iloc[top].to_numpy(),
+        received.iloc[top].to_numpy(),
+        get_column('Сумма операции, коп.', 'продажа').iloc[top].to_numpy(),
+        get_column('Сумма операции, коп.', 'поступление').iloc[top].to_numpy()
+    )
+
+
+
+def build_inventory_table(keys, sold, received, revenue, costs):
+    # Таблица движения товаров для уже выбранных товаров: keys — артикулы и названия,
+    # остальное — массивы проданных и поступивших упаковок, выручки и затрат (в копейках).
+    # Выручка, затраты и прибыль точные, в рубли переводятся в конце.
     # Рассчитываем маржинальность (прибыль = выручка - затраты)
-    inventory_analysis['Прибыль'] = (
-        inventory_analysis['Выручка_от_продаж'] - inventory_analysis['Затраты_на_закупки'])
-    
+    profit = revenue - costs
+
+    inventory_analysis = keys.assign(**{
+        'Продано_упаковок': sold.astype(int),
+        'Выручка_от_продаж': to_rubles(revenue),
+        'Поступлено_упаковок': received.astype(int),
+        'Затраты_на_закупки': to_rubles(costs),
+        'Разница_упаковок': (sold - received).astype(int),
+        'Прибыль': to_rubles(profit)
+    })
+
     # Рассчитываем рентабельность (%), используем маску чтобы избежать деления на ноль
-    mask = inventory_analysis['Затраты_на_закупки'] > 0
-    inventory_analysis['Рентабельность_%'] = 0
-    inventory_analysis.loc[mask, 'Рентабельность_%'] = ((inventory_analysis.loc[mask, 'Прибыль'] / inventory_analysis.loc[mask, 'Затраты_на_закупки']) * 100)
+    has_costs = costs > 0
+    profitability = np.zeros(len(keys))
+    profitability[has_costs] = profit[has_costs] / costs[has_costs] * 100
     # Для товаров, которые были только в продажах (нет затрат на закупку в данных)
-    only_sales_mask = (inventory_analysis['Продано_упаковок'] > 0) & (inventory_analysis['Затраты_на_закупки'] == 0)
-    inventory_analysis.loc[only_sales_mask, 'Рентабельность_%'] = None
-
-    # Сортируем по абсолютному значению разницы (по убыванию)
-    inventory_analysis['Абс_разница'] = inventory_analysis['Разница_упаковок'].abs()
-    inventory_analysis = inventory_analysis.sort_values('Абс_разница', ascending=False)
-    # Удаляем вспомогательную колонку
-    inventory_analysis = inventory_analysis.drop('Абс_разница', axis=1)
-    
-    # Форматируем числовые колонки
-    numeric_cols = ['Продано_упаковок', 'Поступлено_упаковок', 'Разница_упаковок']
-    for col in numeric_cols:
-        inventory_analysis[col] = inventory_analysis[col].astype(int)
-    # Форматируем денежные колонки
-    money_cols = ['Выручка_от_продаж', 'Затраты_на_закупки', 'Прибыль']
-    for col in money_cols:
-        inventory_analysis[col] = inventory_analysis[col].round(2)
-    # Форматируем рентабельность
-    inventory_analysis['Рентабельность_%'] = inventory_analysis['Рентабельность_%'].round(2)
-    
-    # Возвращаем top_n записей
-    return inventory_analysis.head(top_n).reset_index(drop=True)
+    profitability[(sold > 0) & (costs == 0)] = np.nan
+    # Денежные столбцы уже точные до копейки, округляем только рентабельность
+    inventory_analysis['Рентабельность_%'] = profitability.round(2)
+
+    return categories_to_objects(inventory_analysis)
 
 
 
 # Вспомогательная функция для анализа инвентарности
+@profiled
 def get_inventory_insights(inventory_analysis):
     insights = {
         'overstock_candidates': [],  # Возможный дефицит (продажи > поступлений)
@@ -302,10 +1240,10 @@ def get_inventory_insights(inventory_analysis):
     understock_threshold = -inventory_analysis['Продано_упаковок'].mean() * 0.3
     understock_items = inventory_analysis[inventory_analysis['Разница_упаковок'] < understock_threshold]
     
-    # Самые прибыльные товары
-    most_profitable = inventory_analysis.nlargest(5, 'Прибыль')
-    # Наименее прибыльные товары 
-    least_profitable = inventory_analysis.nsmallest(5, 'Прибыль')
+    # Самые и наименее прибыльные товары, за один проход
+    most_positions, least_positions = select_top_bottom_positions(inventory_analysis['Прибыль'].to_numpy(), 5)
+    most_profitable = inventory_analysis.iloc[most_positions]
+    least_profitable = inventory_analysis.iloc[least_positions]
     
     # Заполняем insights
     insights['overstock_candidates'] = overstock_items[[
@@ -337,3 +1275,119 @@ def get_inventory_insights(inventory_analysis):
     }
     
     return insights
+
+
+
+# Движение остатков: строка на каждый день, когда у товара были поступления или продажи
+STOCK_KEYS = ['Артикул', 'Название товара']
+STOCK_VALUES = ['Поступило', 'Продано', 'Остаток']
+
+
+def get_sort_values(values):
+    # Значения столбца для сортировки и сравнения: у категорий — коды (словарь отсортирован)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy()
+    return values.to_numpy()
+
+
+def get_group_starts(frame, keys):
+    # Начала групп в таблице, отсортированной по ключам keys: строки, где меняется хотя бы один ключ
+    changed = np.zeros(len(frame), dtype=bool)
+    changed[:1] = True
+    for key in keys:
+        values = get_sort_values(frame[key])
+        changed[1:] |= values[1:] != values[:-1]
+    return np.flatnonzero(changed)
+
+
+@profiled
+def get_stock_movements(data_clean, keys):
+    # Поступления и продажи упаковок по ключам keys и дням, отсортированные по ключам, а внутри — по дате
+    quantity = 'Количество упаковок, шт.'
+    parts = []
+    for operation_type, column, other in (('поступление', 'Поступило', 'Продано'), ('продажа', 'Продано', 'Поступило')):
+        if isinstance(data_clean, SalesDataset):
+            # Дневные итоги уже есть в кубе, транзакции повторно не просматриваются
+            part = data_clean.cube.get_part(operation_type)
+        else:
+            part = data_clean[get_operation_mask(data_clean['Операция'], [operation_type])]
+        values = part[quantity].to_numpy()
+        parts.append(part[keys + ['Дата']].assign(**{column: values, other: np.zeros_like(values)}))
+    movements = combine_frames(parts)
+    if len(movements) == 0:
+        return movements
+
+    # Сортировка по ключам и дате (lexsort) и суммы по дням через reduceat —
+    # заметно быстрее, чем groupby по нескольким столбцам на миллионах строк
+    order = np.lexsort([get_sort_values(movements[col]) for col in ['Дата'] + keys[::-1]])
+    movements = movements.take(order)
+    starts = get_group_starts(movements, keys + ['Дата'])
+    daily = movements.iloc[starts][keys + ['Дата']].reset_index(drop=True)
+    for col in ['Поступило', 'Продано']:
+        daily[col] = np.add.reduceat(movements[col].to_numpy(), starts)
+    return daily
+
+
+
+@profiled
+@memoized
+def build_stock_ledger(data_clean, by_store=False):
+    # Остаток упаковок после каждого дня движения по каждому товару (by_store=True — в каждом магазине).
+    # Остаток на начало истории неизвестен и считается нулевым, поэтому отрицательный остаток значит,
+    # что товар продавался из запаса, поступившего раньше начала данных.
+    # Строки отсортированы по ключам и дате, остаток — одна накопленная сумма по всей таблице,
+    # из которой вычитается сумма на начало группы, без циклов по товарам.
+    keys = (['Адрес магазина'] if by_store else []) + STOCK_KEYS
+    ledger = get_stock_movements(data_clean, keys)
+    delta = ledger['Поступило'].to_numpy() - ledger['Продано'].to_numpy()
+    running = np.cumsum(delta)
+
+    starts = get_group_starts(ledger, keys)
+    lengths = np.diff(np.append(starts, len(ledger)))
+    opening = running[starts] - delta[starts]
+    ledger['Остаток'] = running - np.repeat(opening, lengths)
+    return ledger
+
+
+@profiled
+def get_stock_summary(ledger, end=None):
+    # Итоги по каждому товару (и магазину) из движения остатков:
+    # поступило и продано за всё время, остаток на конец, сколько дней товара не было в наличии
+    # (остаток на конец дня не больше нуля, до следующего поступления) и на сколько дней хватит остатка
+    # при средних продажах в день с первого движения товара. end — последний день истории
+    # (по умолчанию последняя дата в таблице).
+    keys = [col for col in ledger.columns if col not in STOCK_VALUES and col != 'Дата']
+    if len(ledger) == 0:
+        return pd.DataFrame(columns=keys + ['Поступило', 'Продано', 'Остаток', 'Дней без остатка',
+                                            'Продаж в день', 'Дней запаса'])
+    dates = ledger['Дата'].to_numpy().astype('datetime64[D]')
+    end = dates.max() if end is None else np.datetime64(pd.Timestamp(end), 'D')
+    starts = get_group_starts(ledger, keys)
+    last = np.append(starts[1:], len(ledger)) - 1
+
+    # Сколько дней держится остаток каждой строки: до следующего движения товара, у последней — до конца истории
+    next_dates = np.empty_like(dates)
+    next_dates[:-1] = dates[1:]
+    next_dates[last] = end + 1
+    duration = (next_dates - dates).astype(np.int64)
+
+    balance = ledger['Остаток'].to_numpy()
+    sold = np.add.reduceat(ledger['Продано'].to_numpy(), starts)
+    days = (end + 1 - dates[starts]).astype(np.int64)
+    per_day = sold / days
+    closing = balance[last]
+
+    # Запас в днях: неотрицательный остаток на средние продажи в день; без продаж — пропуск
+    cover = np.full(len(starts), np.nan)
+    selling = per_day > 0
+    cover[selling] = np.maximum(closing[selling], 0) / per_day[selling]
+
+    summary = categories_to_objects(ledger.iloc[starts][keys].reset_index(drop=True))
+    return summary.assign(**{
+        'Поступило': np.add.reduceat(ledger['Поступило'].to_numpy(), starts),
+        'Продано': sold,
+        'Остаток': closing,
+        'Дней без остатка': np.add.reduceat(np.where(balance <= 0, duration, 0), starts),
+        'Продаж в день': per_day.round(2),
+        'Дней запаса': cover.round(1)
+    })
@@ -0,0 +1,232 @@
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+
+
+# Замеры по этапам: время, число строк на входе и выходе и пик памяти.
+# Включаются переменной окружения SALES_PROFILE=1 (SALES_PROFILE=time — только время, без tracemalloc)
+# или вызовом enable(). SALES_TRACE=путь.json дополнительно сохраняет трассу в формате Chrome Trace,
+# которую можно открыть в chrome://tracing, Perfetto или speedscope.
+# Когда замеры выключены, обёрнутая функция сразу вызывает исходную — лишняя только одна проверка флага.
+
+ENABLED = False
+TRACK_MEMORY = False
+TRACE_PATH = None
+
+# Сколько событий трассы хранится в памяти; в долгоживущем процессе (сервер) остальные отбрасываются
+MAX_TRACE_EVENTS = 100_000
+
+# Итоги по этапам копятся по мере завершения замеров, поэтому память не растёт с числом вызовов
+_summary = {}
+_trace = []
+_dropped_events = 0
+_lock = threading.Lock()
+_local = threading.local()
+_started = None
+
+
+def rows_of(value):
+    # Число строк таблицы (или SalesDataset); для кортежа (data, error) смотрим первый элемент
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    shape = getattr(value, "shape", None)
+    if shape is None and hasattr(type(value), "data") and hasattr(value, "__len__"):
+        # У SalesDataset строки считаем через len(): свойство data сливает отложенные
+        # сегменты, а замер не должен менять то, что он меряет.
+        # Объект, который ещё создаётся (self в __init__), строк не имеет
+        try:
+            return len(value)
+        except AttributeError:
+            return None
+    if isinstance(shape, tuple) and shape:
+        return shape[0]
+    return None
+
+
+def get_stack():
+    # Открытые этапы своего потока: у каждого потока своя вложенность
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class Stage:
+    # Один замер. Пик памяти вложенного этапа учитывается и во внешнем
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.peak = 0
+        self.start_memory = 0
+
+    def __enter__(self):
+        stack = get_stack()
+        if TRACK_MEMORY:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = self.peak = current
+        stack.append(self)
+        self.thread = threading.get_ident()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.started
+        stack = get_stack()
+        stack.pop()
+        if TRACK_MEMORY:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        add_record(self)
+        return False
+
+    @property
+    def peak_mb(self):
+        # Сколько памяти этапу понадобилось сверх той, что была занята при его начале
+        return (self.peak - self.start_memory) / 1024 ** 2 if TRACK_MEMORY else None
+
+
+class NullStage:
+    # Заглушка, когда замеры выключены
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+def stage(name, rows_in=None):
+    # Замер участка кода: with stage("название", len(data)) as s: ...; s.rows_out = len(result)
+    return Stage(name, rows_in) if ENABLED else NULL_STAGE
+
+
+def profiled(func):
+    # Декоратор: замер всего вызова функции, строки на входе — у первого аргумента-таблицы
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return func(*args, **kwargs)
+        rows_in = next((rows for rows in map(rows_of, args) if rows is not None), None)
+        with Stage(name, rows_in) as current:
+            result = func(*args, **kwargs)
+            current.rows_out = rows_of(result)
+        return result
+
+    return wrapper
+
+
+def enable(trace_path=None, memory=True):
+    # Включает замеры; сводка печатается (и трасса сохраняется) при завершении программы
+    global ENABLED, TRACK_MEMORY, TRACE_PATH, _started
+    if not ENABLED:
+        atexit.register(finish)
+        _started = time.perf_counter()
+    ENABLED = True
+    TRACK_MEMORY = memory
+    TRACE_PATH = trace_path or TRACE_PATH
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def add_record(record):
+    # Добавляет завершённый замер к итогам этапа и, если нужна трасса, к её событиям
+    global _dropped_events
+    with _lock:
+        item = _summary.setdefault(record.name, {
+            "stage": record.name, "calls": 0, "seconds": 0.0,
+            "rows_in": None, "rows_out": None, "peak_mb": None
+        })
+        item["calls"] += 1
+        item["seconds"] += record.seconds
+        args = {}
+        for key in ("rows_in", "rows_out", "peak_mb"):
+            value = getattr(record, key)
+            if value is not None:
+                item[key] = value if item[key] is None else max(item[key], value)
+                args[key] = value
+        if TRACE_PATH:
+            if len(_trace) < MAX_TRACE_EVENTS:
+                _trace.append((record.name, record.started, record.seconds, record.thread, args))
+            else:
+                _dropped_events += 1
+
+
+def get_summary():
+    # Итоги по каждому этапу за все его вызовы
+    with _lock:
+        return [dict(item) for item in _summary.values()]
+
+
+def format_number(value, pattern):
+    return "" if value is None else format(value, pattern)
+
+
+def print_summary():
+    summary = get_summary()
+    if not summary:
+        return
+    print()
+    print("=" * 100)
+    print("ЗАМЕРЫ ПО ЭТАПАМ (время — суммарно за все вызовы, строки и память — максимум за вызов)")
+    print("=" * 100)
+    print(f"{'этап':<42} {'вызовов':>8} {'время, с':>10} {'строк на входе':>15} {'строк на выходе':>16} {'пик, МБ':>9}")
+    for item in sorted(summary, key=lambda item: -item["seconds"]):
+        print(f"{item['stage']:<42} {item['calls']:>8} {item['seconds']:>10.4f} "
+              f"{format_number(item['rows_in'], 'd'):>15} {format_number(item['rows_out'], 'd'):>16} "
+              f"{format_number(item['peak_mb'], '.1f'):>9}")
+    if _started is not None:
+        print(f"Всего с момента включения замеров: {time.perf_counter() - _started:.3f} с")
+
+
+def write_trace(path):
+    # Трасса в формате Chrome Trace Event: каждое событие — полный интервал ("ph": "X") в микросекундах
+    pid = os.getpid()
+    origin = _started or 0
+    with _lock:
+        trace = list(_trace)
+    events = [{
+        "name": name,
+        "cat": "sales",
+        "ph": "X",
+        "ts": (started - origin) * 1e6,
+        "dur": seconds * 1e6,
+        "pid": pid,
+        "tid": thread,
+        "args": args
+    } for name, started, seconds, thread, args in trace]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    if _dropped_events:
+        print(f"В трассу не попали последние {_dropped_events} событий (хранится не больше {MAX_TRACE_EVENTS})")
+
+
+def finish():
+    # Рабочие процессы (чтение файлов, рендеринг) сводку не печатают, только основной
+    if multiprocessing.parent_process() is not None:
+        return
+    print_summary()
+    if TRACE_PATH:
+        try:
+            write_trace(TRACE_PATH)
+            print(f"Трасса сохранена в {TRACE_PATH}")
+        except OSError as e:
+            print(f"Не удалось сохранить трассу {TRACE_PATH}: {e}")
+
+
+if os.environ.get("SALES_PROFILE") or os.environ.get("SALES_TRACE"):
+    enable(os.environ.get("SALES_TRACE"), memory=os.environ.get("SALES_PROFILE", "1").lower() != "time")
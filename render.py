@@ -0,0 +1,83 @@
+import os
+
+from manager import get_pyplot, plot_revenue_by_period, plot_profit_by_period, plot_category_analysis, plot_top_n_products
+from parallel import map_in_processes
+from profiling import profiled, stage
+
+
+# Рендеринг графиков без экрана в нескольких процессах.
+# На вход подаются уже посчитанные таблицы, поэтому процессам не нужны исходные данные —
+# каждому передаётся только небольшая таблица для одного графика.
+
+CHART_KINDS = ["revenue", "profit", "categories", "top"]
+CHART_FORMATS = ["png", "svg"]
+CHART_DPI = 100
+
+
+def build_figure(kind, table, option=None):
+    # Строит фигуру нужного вида по готовой таблице
+    if kind == "revenue":
+        return plot_revenue_by_period(table, option or 'D')
+    if kind == "profit":
+        return plot_profit_by_period(table)
+    if kind == "categories":
+        return plot_category_analysis(table)
+    return plot_top_n_products(table, option or 'quantity')
+
+
+
+def init_render_worker():
+    # В рабочих процессах окна не нужны; при fork бэкенд мог достаться от родителя, поэтому переключаем явно
+    get_pyplot().switch_backend('Agg')
+
+
+
+def render_chart(job):
+    # Работа для отдельного процесса: построить один график, сохранить его и закрыть фигуру.
+    # Возвращает (путь, None) или (None, текст ошибки).
+    kind, table, option, path = job
+    plt = get_pyplot()
+    try:
+        fig = build_figure(kind, table, option)
+    except Exception as e:
+        plt.close('all')
+        return None, f"{os.path.basename(path)}: ошибка построения графика — {e}"
+    if fig is None:
+        return None, f"{os.path.basename(path)}: нет данных для графика"
+    try:
+        with stage("savefig"):
+            fig.savefig(path, dpi=CHART_DPI)
+    except Exception as e:
+        return None, f"{os.path.basename(path)}: ошибка сохранения — {e}"
+    finally:
+        # Закрываем каждую фигуру сразу, иначе при сотнях графиков они копятся в памяти
+        plt.close(fig)
+    return path, None
+
+
+
+@profiled
+def render_charts(charts, output_dir, fmt="png", workers=None):
+    # Сохраняет графики в output_dir. charts — список кортежей (имя файла без расширения, вид графика,
+    # готовая таблица, параметр: период для revenue или метрика для top).
+    # workers — число процессов (по умолчанию по числу ядер, но не больше числа графиков).
+    # Возвращает словарь {имя: путь к файлу}; графики, которые не получились, в него не попадают.
+    if fmt not in CHART_FORMATS:
+        print(f"Неподдерживаемый формат графиков: {fmt}")
+        return {}
+    if not charts:
+        return {}
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(kind, table, option, os.path.join(output_dir, f"{name}.{fmt}"))
+            for name, kind, table, option in charts]
+
+    results = map_in_processes(render_chart, jobs, workers, init_render_worker)
+
+    rendered = {}
+    for (name, _, _, _), (path, error) in zip(charts, results):
+        if error is not None:
+            print(f"  {error}")
+        else:
+            rendered[name] = path
+    return rendered
@@ -0,0 +1,234 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from manager import load_dataset
+from profiling import enable as enable_profiling
+from render import CHART_FORMATS, render_charts
+from process import get_inventory_insights
+from shards import SHARD_KEYS, compute_analysis, get_analysis_name, run_sharded
+
+
+# Набор анализов по умолчанию: всё, что умеет интерактивное меню
+DEFAULT_ANALYSES = [
+    "revenue:D", "revenue:W", "revenue:M",
+    "profit:D", "profit:W", "profit:M",
+    "categories",
+    "top:quantity", "top:revenue",
+    "inventory"
+]
+PERIODS = ["D", "W", "M"]
+METRICS = ["quantity", "revenue"]
+STOCK_LEVELS = ["article", "store"]
+SUMMARY_FILE = "summary.json"
+
+
+def parse_analysis(spec):
+    # Разбирает строку вида "revenue:W" в пару (анализ, параметр), при ошибке возвращает None
+    name, _, option = spec.strip().partition(":")
+    if name in ("revenue", "profit"):
+        option = option.upper() or "D"
+        return (name, option) if option in PERIODS else None
+    if name == "top":
+        option = option or "quantity"
+        return (name, option) if option in METRICS else None
+    if name == "stock":
+        option = option or "article"
+        return (name, option) if option in STOCK_LEVELS else None
+    if name in ("categories", "inventory") and not option:
+        return (name, None)
+    return None
+
+
+def is_valid_date(value):
+    # Дата в формате ГГГГ-ММ-ДД (как параметр date у сервера) или all
+    if value == "all":
+        return True
+    try:
+        pd.to_datetime(value, format="%Y-%m-%d")
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def to_json_value(value):
+    # Приводит numpy-типы, даты и пропуски к тому, что понимает json
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "isoformat"):
+        # datetime и pd.Timestamp записываем в формате ISO 8601
+        return value.isoformat()
+    return value
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_json_value(data), f, ensure_ascii=False, indent=2)
+
+
+def save_table(table, output_dir, name, index=False):
+    path = os.path.join(output_dir, f"{name}.csv")
+    table.to_csv(path, index=index, encoding="utf-8")
+    return path
+
+
+def run_analysis(dataset, name, option, output_dir, top_n, date):
+    # Выполняет один анализ, сохраняет таблицы и возвращает список созданных файлов
+    # и список графиков для рендеринга: (имя файла, вид графика, таблица, параметр)
+    table = compute_analysis(dataset, name, option, top_n, date)
+    if table is None:
+        return [], []
+    file_name = get_analysis_name(name, option)
+
+    if name == "categories":
+        return [save_table(table, output_dir, file_name, index=True)], [(file_name, name, table, None)]
+
+    if name == "inventory":
+        # Полная таблица оборачиваемости в CSV, выводы отчёта в JSON
+        path = os.path.join(output_dir, "inventory.json")
+        write_json(path, get_inventory_insights(table))
+        return [save_table(table, output_dir, file_name), path], []
+
+    if name == "stock":
+        # Итоги движения остатков по товарам — только таблица, без графика
+        return [save_table(table, output_dir, file_name)], []
+
+    return [save_table(table, output_dir, file_name)], [(file_name, name, table, option)]
+
+
+def run_sharded_analyses(dataset, parsed, shard_by, output_dir, top_n, date, workers):
+    # Те же анализы отдельно по каждому магазину или району, в нескольких процессах.
+    # Каждая таблица сохраняется в файл вида revenue_D_by_store.csv. Возвращает записи для сводки.
+    started = time.perf_counter()
+    tables = run_sharded(dataset, shard_by, [analysis for _, analysis in parsed], top_n, date, workers)
+    if tables is None:
+        return None
+    files = [save_table(table, output_dir, f"{name}_by_{shard_by}")
+             for name, table in tables.items() if table is not None]
+    return {
+        "by": shard_by,
+        "files": [os.path.basename(path) for path in files],
+        "seconds": time.perf_counter() - started
+    }
+
+
+def run_batch_report(file_path, analyses=None, output_dir="report", top_n=10, date="all",
+                     chart_format="png", workers=None, chunksize=None, shard_by=None):
+    # Загружает данные один раз, выполняет все анализы и пишет результаты в output_dir.
+    # Графики рисуются после всех расчётов, параллельно в workers процессах;
+    # столько же процессов читают файлы, если источник — каталог, шаблон или список.
+    # chunksize — читать файл кусками и держать в памяти только агрегаты (для файлов больше памяти).
+    # shard_by — "store" или "district": дополнительно выполнить анализы по каждому магазину или району.
+    # Возвращает сводку (она же сохраняется в summary.json) или None, если данные не загрузились.
+    analyses = DEFAULT_ANALYSES if analyses is None else analyses
+    parsed = []
+    for spec in analyses:
+        analysis = parse_analysis(spec)
+        if analysis is None:
+            print(f"Неизвестный анализ: {spec}")
+            return None
+        parsed.append((spec, analysis))
+
+    started = time.perf_counter()
+    dataset = load_dataset(file_path, chunksize, workers)
+    if dataset is None:
+        print("Не получилось загрузить данные.")
+        return None
+    load_seconds = time.perf_counter() - started
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {
+        "source": file_path,
+        "rows": len(dataset),
+        "top_n": top_n,
+        "date": date,
+        "load_seconds": load_seconds,
+        "analyses": []
+    }
+    charts = []
+    for spec, (name, option) in parsed:
+        analysis_started = time.perf_counter()
+        files, analysis_charts = run_analysis(dataset, name, option, output_dir, top_n, date)
+        summary["analyses"].append({
+            "analysis": spec,
+            "files": [os.path.basename(path) for path in files],
+            "charts": [chart[0] for chart in analysis_charts],
+            "seconds": time.perf_counter() - analysis_started
+        })
+        charts.extend(analysis_charts)
+
+    if shard_by is not None:
+        summary["sharded"] = run_sharded_analyses(dataset, parsed, shard_by, output_dir, top_n, date, workers)
+        if summary["sharded"] is None:
+            return None
+
+    render_started = time.perf_counter()
+    # Пакетный режим работает без экрана, графики только сохраняются в файлы. Бэкенд задаётся здесь,
+    # а не при импорте: сервер и database.py берут из report только вспомогательные функции.
+    # Сам matplotlib загрузится лишь при первом графике и подхватит бэкенд из переменной окружения
+    os.environ["MPLBACKEND"] = "Agg"
+    rendered = render_charts(charts, output_dir, chart_format, workers)
+    summary["render_seconds"] = time.perf_counter() - render_started
+    for entry in summary["analyses"]:
+        # В список файлов анализа добавляем только графики, которые удалось сохранить
+        entry["files"] += [os.path.basename(rendered[chart]) for chart in entry.pop("charts") if chart in rendered]
+    summary["total_seconds"] = time.perf_counter() - started
+
+    write_json(os.path.join(output_dir, SUMMARY_FILE), summary)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Пакетный отчёт по продажам без интерактивных вопросов")
+    parser.add_argument("source", help="CSV-файл, каталог или шаблон (например, data/*.csv)")
+    parser.add_argument("-a", "--analyses", nargs="+", default=DEFAULT_ANALYSES,
+                        help="анализы: revenue:D|W|M, profit:D|W|M, categories, top:quantity|revenue, inventory, stock:article|store")
+    parser.add_argument("-o", "--output", default="report", help="каталог для результатов")
+    parser.add_argument("-n", "--top-n", type=int, default=10, help="размер топа товаров и отчёта по движению")
+    parser.add_argument("-d", "--date", default="all", help="дата ГГГГ-ММ-ДД для топа товаров или all")
+    parser.add_argument("-f", "--format", default="png", choices=CHART_FORMATS, help="формат графиков")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="число процессов для чтения файлов, рендеринга графиков и анализов по магазинам (по умолчанию по числу ядер)")
+    parser.add_argument("-c", "--chunksize", type=int, default=None,
+                        help="читать файл кусками по столько строк, не загружая его целиком")
+    parser.add_argument("-s", "--shard-by", default=None, choices=list(SHARD_KEYS),
+                        help="дополнительно выполнить анализы отдельно по каждому магазину или району")
+    parser.add_argument("--profile", action="store_true",
+                        help="замерить время, строки и память по этапам и вывести сводку в конце")
+    parser.add_argument("--trace", default=None, help="сохранить трассу этапов в JSON (формат Chrome Trace)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.top_n <= 0:
+        print("Размер топа должен быть целым положительным числом")
+        return 1
+    if not is_valid_date(args.date):
+        print("Дата должна быть в формате ГГГГ-ММ-ДД или all")
+        return 1
+    if args.profile or args.trace:
+        enable_profiling(args.trace)
+    summary = run_batch_report(args.source, args.analyses, args.output, args.top_n, args.date,
+                               args.format, args.workers, args.chunksize, args.shard_by)
+    if summary is None:
+        return 1
+    print(f"Отчёт сохранён в {args.output}: {len(summary['analyses'])} анализов "
+          f"за {summary['total_seconds']:.2f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
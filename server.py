@@ -0,0 +1,311 @@
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from manager import load_dataset
+from process import calculate_revenue_by_period, calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products, analyze_inventory_turnover, get_inventory_insights, TOP_GROUP_COLUMNS
+from report import PERIODS, METRICS, to_json_value
+
+
+# Сервер аналитики: данные загружаются один раз и остаются в памяти,
+# пять анализов из меню доступны по HTTP в формате JSON, запросы обслуживаются параллельно.
+#
+#   python server.py serve "Data 1.csv" июнь=data/june.csv --port 8765
+#   curl "http://127.0.0.1:8765/top?dataset=Data 1&n=5&metric=revenue"
+#   python server.py loadtest --url http://127.0.0.1:8765 -n 2000 -c 8
+#
+# Адреса: /datasets, /revenue?period=D|W|M, /profit?period=D|W|M, /categories,
+# /top?n=5&metric=quantity|revenue&date=ГГГГ-ММ-ДД&by=столбец, /inventory?top_n=10.
+# У всех анализов есть параметр dataset (можно не указывать, если набор данных один),
+# у выручки, прибыли и топа — start и end (включительно).
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TOP_N = 10
+
+
+class BadRequest(Exception):
+    # Ошибка в параметрах запроса, клиент получает ответ 400 с текстом ошибки
+    pass
+
+
+class NotFound(Exception):
+    # Неизвестный адрес или набор данных, клиент получает ответ 404 с текстом ошибки
+    pass
+
+
+def table_to_json(table):
+    # Таблица результата в виде списка строк-словарей; индекс (например, отдел в категориях) становится столбцом
+    if table is None:
+        return None
+    if not isinstance(table.index, pd.RangeIndex):
+        table = table.reset_index()
+    return to_json_value(table.to_dict("records"))
+
+
+def get_param(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def get_int_param(params, name, default):
+    value = get_param(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"Параметр {name} должен быть целым числом")
+    if number <= 0:
+        raise BadRequest(f"Параметр {name} должен быть положительным")
+    return number
+
+
+def get_choice_param(params, name, choices, default):
+    value = get_param(params, name, default)
+    if value not in choices:
+        raise BadRequest(f"Параметр {name} должен быть одним из: {', '.join(choices)}")
+    return value
+
+
+def get_date_param(params, name):
+    value = get_param(params, name)
+    if value is not None:
+        try:
+            pd.to_datetime(value, format="%Y-%m-%d")
+        except (ValueError, TypeError):
+            raise BadRequest(f"Параметр {name} должен быть датой ГГГГ-ММ-ДД")
+    return value
+
+
+def run_revenue(dataset, params):
+    period = get_choice_param(params, "period", PERIODS, "D")
+    return table_to_json(calculate_revenue_by_period(dataset, period, get_date_param(params, "start"), get_date_param(params, "end")))
+
+
+def run_profit(dataset, params):
+    period = get_choice_param(params, "period", PERIODS, "D")
+    return table_to_json(calculate_profit_by_period(dataset, period, get_date_param(params, "start"), get_date_param(params, "end")))
+
+
+def run_categories(dataset, params):
+    return table_to_json(aggregate_sales_by_category(dataset))
+
+
+def run_top(dataset, params):
+    n = get_int_param(params, "n", 5)
+    metric = get_choice_param(params, "metric", METRICS, "quantity")
+    date = get_param(params, "date", "all")
+    if date != "all" and not dataset.has_date(date):
+        raise BadRequest("Параметр date должен быть датой ГГГГ-ММ-ДД, за которую есть операции")
+    by = get_param(params, "by")
+    if by is not None and by not in TOP_GROUP_COLUMNS:
+        raise BadRequest(f"Параметр by должен быть одним из: {', '.join(TOP_GROUP_COLUMNS)}")
+    return table_to_json(get_top_n_products(dataset, n, metric, date, get_date_param(params, "start"), get_date_param(params, "end"), by))
+
+
+def run_inventory(dataset, params):
+    inventory_analysis = analyze_inventory_turnover(dataset, get_int_param(params, "top_n", DEFAULT_TOP_N))
+    return {
+        "table": table_to_json(inventory_analysis),
+        "insights": to_json_value(get_inventory_insights(inventory_analysis))
+    }
+
+
+# Адрес -> функция анализа
+ANALYSES = {
+    "/revenue": run_revenue,
+    "/profit": run_profit,
+    "/categories": run_categories,
+    "/top": run_top,
+    "/inventory": run_inventory
+}
+
+
+def warm_up(dataset):
+    # Дневной куб, итоги по товарам и список дат считаем сразу при загрузке,
+    # чтобы первые параллельные запросы не строили их одновременно
+    dataset.cube.get_daily_totals("продажа")
+    dataset.turnover_sums
+    dataset.dates
+
+
+def load_datasets(sources):
+    # sources — список "путь" или "имя=путь"; имя по умолчанию — имя файла без расширения.
+    # Возвращает словарь {имя: SalesDataset} или None, если что-то не загрузилось
+    datasets = {}
+    for source in sources:
+        name, _, path = source.rpartition("=")
+        if not name:
+            name = os.path.splitext(os.path.basename(path.rstrip("/")))[0]
+        print(f"Загружаю {name}: {path}")
+        dataset = load_dataset(path)
+        if dataset is None:
+            print(f"Не получилось загрузить данные: {path}")
+            return None
+        warm_up(dataset)
+        datasets[name] = dataset
+    return datasets
+
+
+class AnalyticsHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1: клиент может отправлять много запросов по одному соединению
+    protocol_version = "HTTP/1.1"
+    datasets = {}
+    quiet = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/datasets":
+                body = [{"name": name, "rows": len(dataset), "version": dataset.version}
+                        for name, dataset in self.datasets.items()]
+                self.send_json(200, body)
+                return
+            analysis = ANALYSES.get(url.path)
+            if analysis is None:
+                raise NotFound(f"Неизвестный адрес: {url.path}")
+            self.send_json(200, analysis(self.get_dataset(params), params))
+        except BadRequest as e:
+            self.send_json(400, {"error": str(e)})
+        except NotFound as e:
+            self.send_json(404, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": f"Ошибка при выполнении анализа: {e}"})
+
+    def get_dataset(self, params):
+        name = get_param(params, "dataset")
+        if name is None:
+            if len(self.datasets) != 1:
+                raise BadRequest("Укажите параметр dataset: " + ", ".join(self.datasets))
+            return next(iter(self.datasets.values()))
+        if name not in self.datasets:
+            raise NotFound(f"Нет набора данных {name}")
+        return self.datasets[name]
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def serve(sources, host=DEFAULT_HOST, port=DEFAULT_PORT, quiet=False):
+    datasets = load_datasets(sources)
+    if datasets is None:
+        return 1
+    AnalyticsHandler.datasets = datasets
+    AnalyticsHandler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), AnalyticsHandler)
+    server.daemon_threads = True
+    print(f"Сервер запущен: http://{host}:{server.server_port} (наборы данных: {', '.join(datasets)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Останавливаю сервер")
+    finally:
+        server.server_close()
+    return 0
+
+
+# Запросы нагрузочного теста: все пять анализов с разными параметрами
+LOAD_TEST_PATHS = [
+    "/revenue?period=D", "/revenue?period=W", "/revenue?period=M",
+    "/profit?period=D", "/profit?period=W",
+    "/categories",
+    "/top?n=5&metric=quantity", "/top?n=10&metric=revenue", "/top?n=3&metric=revenue&by=Отдел товара",
+    "/inventory?top_n=10"
+]
+
+
+def run_load_test(url, requests=1000, concurrency=8, dataset=None):
+    # Отправляет requests запросов в concurrency потоков (у каждого потока своё соединение)
+    # и возвращает сводку: запросов в секунду и задержки (p50, p95, p99) в миллисекундах
+    parts = urlsplit(url)
+    paths = LOAD_TEST_PATHS
+    if dataset is not None:
+        paths = [f"{path}{'&' if '?' in path else '?'}dataset={dataset}" for path in paths]
+    paths = [quote(path, safe="/?=&") for path in paths]
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        started = time.perf_counter()
+        try:
+            local.connection.request("GET", paths[i % len(paths)])
+            response = local.connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            local.connection.close()
+            del local.connection
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(not ok for _, ok in results),
+        "seconds": elapsed,
+        "requests_per_second": requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер аналитики продаж и нагрузочный тест к нему")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="загрузить данные и запустить сервер")
+    serve_parser.add_argument("sources", nargs="+", help="файлы (каталоги, шаблоны) в виде путь или имя=путь")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--quiet", action="store_true", help="не писать каждый запрос в журнал")
+
+    load_parser = commands.add_parser("loadtest", help="нагрузочный тест запущенного сервера")
+    load_parser.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+    load_parser.add_argument("-n", "--requests", type=int, default=1000)
+    load_parser.add_argument("-c", "--concurrency", type=int, default=8)
+    load_parser.add_argument("--dataset", default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        return serve(args.sources, args.host, args.port, args.quiet)
+
+    summary = run_load_test(args.url, args.requests, args.concurrency, args.dataset)
+    print(f"Запросов: {summary['requests']} в {summary['concurrency']} потоков, ошибок: {summary['errors']}")
+    print(f"Запросов в секунду: {summary['requests_per_second']:.1f}")
+    print(f"Задержка, мс: p50 {summary['p50_ms']:.2f}, p95 {summary['p95_ms']:.2f}, "
+          f"p99 {summary['p99_ms']:.2f}, макс. {summary['max_ms']:.2f}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from parallel import map_in_processes
+from profiling import profiled
+from process import SalesDataset, combine_frames, calculate_revenue_by_period, calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products, analyze_inventory_turnover, build_stock_ledger, get_stock_summary
+
+
+# Анализы отдельно по каждому магазину или району.
+# Набор данных один раз разбивается на части (шарды) по магазину или району, каждая часть
+# считается в отдельном процессе всеми нужными анализами, а результаты склеиваются
+# в одну таблицу на анализ, где первый столбец — магазин или район.
+
+SHARD_KEYS = {
+    "store": "Адрес магазина",
+    "district": "Район магазина"
+}
+
+
+def get_analysis_name(name, option):
+    # Имя результата анализа для файлов и ключей: revenue_D, top_quantity, categories
+    return name if option is None else f"{name}_{option}"
+
+
+def compute_analysis(dataset, name, option, top_n=10, date="all"):
+    # Таблица одного анализа: name и option — как в report.parse_analysis
+    if name == "revenue":
+        return calculate_revenue_by_period(dataset, option)
+    if name == "profit":
+        return calculate_profit_by_period(dataset, option)
+    if name == "categories":
+        return aggregate_sales_by_category(dataset)
+    if name == "top":
+        return get_top_n_products(dataset, top_n, option, date)
+    if name == "stock":
+        return get_stock_summary(build_stock_ledger(dataset, option == "store"))
+    return analyze_inventory_turnover(dataset, top_n)
+
+
+@profiled
+def split_dataset(dataset, column):
+    # Разбивает SalesDataset на части по значениям столбца column.
+    # Возвращает список пар (значение, SalesDataset) в порядке значений.
+    # Строки набора уже отсортированы по типу операции и дате, устойчивая сортировка по номеру части
+    # этот порядок сохраняет, поэтому каждая часть — тоже готовый SalesDataset без повторной сортировки
+    codes, values = pd.factorize(dataset.data[column], sort=True)
+    names = list(dataset.partitions)
+    lengths = [part.stop - part.start for part in dataset.partitions.values()]
+    operation_codes = np.repeat(np.arange(len(names)), lengths)
+
+    # Число строк каждого типа операции в каждой части
+    counts = np.bincount(codes * len(names) + operation_codes,
+                         minlength=len(values) * len(names)).reshape(len(values), len(names))
+    order = np.argsort(codes, kind="stable")
+    data = dataset.data.take(order).reset_index(drop=True)
+
+    shards = []
+    start = 0
+    for value, shard_counts in zip(values, counts):
+        bounds = np.concatenate([[0], np.cumsum(shard_counts)])
+        stop = start + int(bounds[-1])
+        partitions = {name: (bounds[i], bounds[i + 1]) for i, name in enumerate(names)}
+        shards.append((value, SalesDataset(data.iloc[start:stop], partitions)))
+        start = stop
+    return shards
+
+
+def analyze_shard(value, dataset, analyses, top_n, date):
+    # Все анализы одной части. Сообщения функций анализа (например, об отсутствии расходов)
+    # собираются и возвращаются, чтобы не печатать одно и то же для каждого магазина.
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        tables = [compute_analysis(dataset, name, option, top_n, date) for name, option in analyses]
+    return value, tables, output.getvalue().splitlines()
+
+
+def analyze_shard_job(job):
+    # Работа для отдельного процесса: часть приходит таблицей с границами типов операций
+    value, data, partitions, analyses, top_n, date = job
+    return analyze_shard(value, SalesDataset(data, partitions), analyses, top_n, date)
+
+
+def merge_shard_tables(column, values, tables):
+    # Склеивает таблицы частей в одну, первым столбцом ставит магазин или район.
+    # Категории (например, отдел товара) становятся обычным столбцом, как в CSV.
+    frames = []
+    for value, table in zip(values, tables):
+        if table is None or len(table) == 0:
+            continue
+        if not isinstance(table.index, pd.RangeIndex):
+            table = table.reset_index()
+        frames.append(table.assign(**{column: value}))
+    if not frames:
+        return None
+    merged = combine_frames(frames)
+    return merged[[column] + [col for col in merged.columns if col != column]]
+
+
+@profiled
+def run_sharded(dataset, by="store", analyses=(("revenue", "D"),), top_n=10, date="all", workers=None):
+    # Выполняет анализы отдельно для каждого магазина (by="store") или района (by="district").
+    # analyses — список пар (анализ, параметр), как их возвращает report.parse_analysis.
+    # workers — число процессов (по умолчанию по числу ядер, но не больше числа частей).
+    # Возвращает словарь {имя анализа: общая таблица} или None, если разбить данные нельзя.
+    column = SHARD_KEYS.get(by)
+    if column is None:
+        print(f"Неизвестный разрез: {by}. Доступны: {', '.join(SHARD_KEYS)}")
+        return None
+    if column not in dataset.data.columns:
+        # Например, агрегаты файла, прочитанного кусками, не хранят район магазина
+        print(f"В данных нет столбца «{column}», разбить по нему нельзя")
+        return None
+
+    analyses = list(analyses)
+    shards = split_dataset(dataset, column)
+    # Часть передаётся таблицей с границами типов операций; в одном процессе из неё
+    # так же без копирования собирается SalesDataset
+    jobs = [(value, shard.data, {name: (part.start, part.stop) for name, part in shard.partitions.items()},
+             analyses, top_n, date) for value, shard in shards]
+    results = map_in_processes(analyze_shard_job, jobs, workers)
+
+    # Каждое сообщение печатаем один раз, а не для каждой части
+    messages = dict.fromkeys(message for _, _, lines in results for message in lines)
+    for message in messages:
+        print(message)
+
+    values = [value for value, _, _ in results]
+    return {
+        get_analysis_name(name, option): merge_shard_tables(column, values, [tables[i] for _, tables, _ in results])
+        for i, (name, option) in enumerate(analyses)
+    }
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from process import DEFAULT_CHUNK_SIZE, SalesReadError, get_operation_mask, iter_sales_chunks, to_rubles
+from profiling import profiled
+from topk import select_top_positions
+
+
+# Потоковый топ-N товаров с фиксированной памятью (алгоритм Space-Saving со взвешенными счётчиками).
+# Хранится не больше capacity счётчиков, сколько бы товаров ни было в каталоге, а данные можно
+# подавать кусками по мере поступления. Для каждого товара в топе известна оценка сверху и погрешность:
+# настоящая сумма лежит в пределах [оценка - погрешность, оценка].
+# Товары, которых нет среди счётчиков, продавались не больше, чем на max_error.
+# Выручка считается в целых копейках, в рубли переводится только таблица top().
+
+DEFAULT_CAPACITY = 1000
+METRIC_COLUMNS = {
+    "quantity": "Количество упаковок, шт.",
+    "revenue": "Сумма операции, коп."
+}
+# Названия столбцов с суммой, как у get_top_n_products
+RESULT_COLUMNS = {
+    "quantity": "Сумма_Количество упаковок, шт.",
+    "revenue": "Сумма_Сумма операции"
+}
+
+
+class SpaceSaving:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, metric="quantity", key="Название товара"):
+        # capacity — число счётчиков: чем больше, тем точнее, память растёт только с ним.
+        # metric — quantity или revenue, key — столбец товара ('Название товара' или 'Артикул')
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        self.capacity = capacity
+        self.metric = metric
+        self.key = key
+        self.keys = np.array([], dtype=object)
+        self.counts = np.array([], dtype=np.int64)
+        self.errors = np.array([], dtype=np.int64)
+        # Сумма метрики по всему потоку (в упаковках или копейках)
+        self.total = 0
+
+    @property
+    def max_error(self):
+        # Наибольшая возможная сумма товара, которого нет среди счётчиков; она же — наибольшая погрешность.
+        # Пока счётчики не заполнены, все товары учитываются точно
+        if len(self.keys) < self.capacity:
+            return 0
+        return self.counts.min()
+
+    def add(self, keys, weights):
+        # Добавляет суммы по товарам: keys — товары (каждый один раз), weights — их суммы.
+        # Счётчики и новые суммы сливаются, как две сводки Space-Saving: товару, которого
+        # не было среди счётчиков, к сумме и к погрешности добавляется max_error.
+        # Затем остаются capacity товаров с наибольшими оценками.
+        keys = np.asarray(keys, dtype=object)
+        weights = np.asarray(weights)
+        # Целые суммы (упаковки, копейки) складываются точно в int64, дробное количество — во float
+        dtype = np.result_type(self.counts, weights)
+        floor = self.max_error
+        codes, uniques = pd.factorize(np.concatenate([self.keys, keys]))
+        monitored = codes[:len(self.keys)]
+
+        counts = np.full(len(uniques), floor, dtype=dtype)
+        errors = np.full(len(uniques), floor, dtype=dtype)
+        counts[monitored] = self.counts
+        errors[monitored] = self.errors
+        counts[codes[len(self.keys):]] += weights
+
+        keep = select_top_positions(counts, self.capacity)
+        self.keys = np.asarray(uniques, dtype=object)[keep]
+        self.counts = counts[keep]
+        self.errors = errors[keep]
+        self.total += weights.sum()
+
+    @profiled
+    def update(self, chunk):
+        # Добавляет кусок очищенных данных (например, из iter_sales_chunks): учитываются только продажи
+        sales = chunk[get_operation_mask(chunk['Операция'], ["продажа"])]
+        sums = sales.groupby(self.key, observed=True)[METRIC_COLUMNS[self.metric]].sum()
+        self.add(sums.index.to_numpy(), sums.to_numpy())
+
+    def top(self, n=5):
+        # Топ-n по оценкам в том же виде, что и get_top_n_products, плюс границы:
+        # 'Погрешность' — насколько оценка может быть больше настоящей суммы,
+        # 'Точно в топе' — товар гарантированно входит в настоящий топ-n
+        # (его сумма не меньше, чем у любого товара за пределами выдачи)
+        order = select_top_positions(self.counts, len(self.counts))
+        counts, errors = self.counts[order], self.errors[order]
+        top = order[:n]
+        # Верхняя граница суммы любого товара вне выдачи: следующая оценка или max_error
+        outside = counts[n] if len(counts) > n else self.max_error
+        top_counts, top_errors = counts[:n], errors[:n]
+        guaranteed = top_counts - top_errors >= outside
+        if self.metric == "revenue":
+            top_counts, top_errors = to_rubles(top_counts), to_rubles(top_errors)
+        return pd.DataFrame({
+            self.key: self.keys[top],
+            RESULT_COLUMNS[self.metric]: top_counts,
+            'Погрешность': top_errors,
+            'Точно в топе': guaranteed
+        })
+
+
+@profiled
+def stream_top_n_products(file_path, n=5, metric="quantity", capacity=DEFAULT_CAPACITY,
+                          chunksize=DEFAULT_CHUNK_SIZE, key="Название товара"):
+    # Топ-n товаров по файлу, который читается кусками и не хранится в памяти целиком.
+    # Возвращает таблицу SpaceSaving.top или None, если файл не удалось прочитать.
+    if metric not in METRIC_COLUMNS:
+        print(f"Неизвестная метрика: {metric}")
+        return None
+    tracker = SpaceSaving(capacity, metric, key)
+    chunks = 0
+    try:
+        for chunk in iter_sales_chunks(file_path, chunksize):
+            tracker.update(chunk)
+            chunks += 1
+    except SalesReadError as e:
+        # Топ по части файла выглядел бы как полный результат
+        print(e)
+        return None
+    if chunks == 0:
+        return None
+    return tracker.top(n)
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import PROJECT_DIR
+from process import (SalesDataset, load_sales_data, preprocess_data, calculate_revenue_by_period,
+                     calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products,
+                     analyze_inventory_turnover)
+
+
+# Добавление дельт в SalesDataset должно давать то же, что полная пересборка набора данных
+
+
+def run_analyses(dataset):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "revenue_D": calculate_revenue_by_period(dataset, "D"),
+            "profit_W": calculate_profit_by_period(dataset, "W"),
+            "categories": aggregate_sales_by_category(dataset),
+            "top_quantity": get_top_n_products(dataset, 10, "quantity"),
+            "top_revenue": get_top_n_products(dataset, 10, "revenue"),
+            "inventory": analyze_inventory_turnover(dataset, 10)
+        }
+
+
+@pytest.fixture(scope="module")
+def data_clean():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return preprocess_data(load_sales_data(os.path.join(PROJECT_DIR, "Data 1.csv")))
+
+
+def test_append_same_day_batches(data_clean):
+    # Последний день приходит тремя частями: вторая и третья — за уже известную дату
+    last_day = data_clean['Дата'].max()
+    base = data_clean[data_clean['Дата'] < last_day]
+    delta = data_clean[data_clean['Дата'] == last_day]
+    dataset = SalesDataset(base)
+    run_analyses(dataset)  # куб и итоги по товарам уже посчитаны и обновляются при добавлении
+
+    step = len(delta) // 3
+    for start in range(0, len(delta), step):
+        dataset.append(delta.iloc[start:start + step])
+
+    expected = run_analyses(SalesDataset(data_clean))
+    for name, table in run_analyses(dataset).items():
+        pd.testing.assert_frame_equal(table, expected[name], obj=name)
+    assert list(dataset.cube.parts['продажа'].columns) == dataset.cube.KEYS + dataset.cube.VALUES
+
+
+def test_append_backdated_batch(data_clean):
+    # Дельта задним числом: первый день приходит после всех остальных
+    first_day = data_clean['Дата'].min()
+    dataset = SalesDataset(data_clean[data_clean['Дата'] > first_day])
+    run_analyses(dataset)
+    dataset.append(data_clean[data_clean['Дата'] == first_day])
+
+    expected = run_analyses(SalesDataset(data_clean))
+    for name, table in run_analyses(dataset).items():
+        pd.testing.assert_frame_equal(table, expected[name], obj=name)
+
+
+def test_append_rows_match_rebuild(data_clean):
+    # Отложенные сегменты вливаются в общую таблицу в том же порядке строк, что и при пересборке
+    first_day, last_day = data_clean['Дата'].min(), data_clean['Дата'].max()
+    middle = (data_clean['Дата'] > first_day) & (data_clean['Дата'] < last_day)
+    dataset = SalesDataset(data_clean[middle])
+    dataset.append(data_clean[data_clean['Дата'] == last_day])
+    dataset.append(data_clean[data_clean['Дата'] == first_day])
+    assert len(dataset) == len(data_clean)
+
+    expected = SalesDataset(pd.concat([data_clean[middle], data_clean[data_clean['Дата'] == last_day],
+                                       data_clean[data_clean['Дата'] == first_day]]))
+    for name in expected.partitions:
+        pd.testing.assert_frame_equal(dataset.get_operation(name).reset_index(drop=True),
+                                      expected.get_operation(name).reset_index(drop=True), obj=name)
+
+
+def test_append_skips_known_operations(data_clean):
+    dataset = SalesDataset(data_clean)
+    assert dataset.append(data_clean.iloc[:100]) == 0
+    assert len(dataset) == len(data_clean)
@@ -0,0 +1,33 @@
+import contextlib
+import io
+import os
+import shutil
+
+from cache import load_cached_dataset
+from conftest import PROJECT_DIR
+
+
+def quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def test_in_place_edit_with_same_size_and_mtime_rebuilds_cache(tmp_path):
+    # Правка на месте, после которой размер и время изменения файла прежние, всё равно сбрасывает кэш
+    path = str(tmp_path / "data.csv")
+    shutil.copy(os.path.join(PROJECT_DIR, "Data 1.csv"), path)
+    cache_dir = str(tmp_path / "cache")
+    before = quiet(load_cached_dataset, path, cache_dir)
+    total = before.data['Количество упаковок, шт.'].sum()
+
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        content = f.read()
+    edited = content.replace(b";180;", b";190;", 1)
+    assert edited != content and len(edited) == len(content)
+    with open(path, "wb") as f:
+        f.write(edited)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    after = quiet(load_cached_dataset, path, cache_dir)
+    assert after.data['Количество упаковок, шт.'].sum() == total + 10
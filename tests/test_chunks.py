@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import PROJECT_DIR
+from process import (SalesDataset, fold_sales_chunks, load_sales_data, preprocess_data,
+                     calculate_revenue_by_period, get_top_n_products)
+from streaming import stream_top_n_products
+
+
+# Потоковое чтение не должно выдавать результат по части файла за полный
+
+DATA_FILE = os.path.join(PROJECT_DIR, "Data 1.csv")
+
+
+def quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def write_lines(path, lines):
+    with open(path, "wb") as f:
+        f.write(b"\r\n".join(lines))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def lines():
+    with open(DATA_FILE, "rb") as f:
+        return f.read().split(b"\r\n")
+
+
+def test_broken_line_mid_file_fails_whole_read(tmp_path, lines):
+    # Лишние поля в строке 2001: первые куски уже прочитаны, но результата по ним быть не должно
+    broken = list(lines)
+    broken[2000] += b";x;y"
+    path = write_lines(tmp_path / "broken.csv", broken)
+
+    assert quiet(fold_sales_chunks, path, 500) is None
+    assert quiet(stream_top_n_products, path, chunksize=500) is None
+    assert quiet(load_sales_data, path) is None
+
+
+def test_cp1251_tail_is_read_after_utf8_chunks(tmp_path, lines):
+    # Начало файла в UTF-8, хвост в cp1251: потоковое чтение дочитывает хвост в cp1251
+    mixed = lines[:2001] + [line.decode("utf-8").encode("cp1251") for line in lines[2001:]]
+    path = write_lines(tmp_path / "mixed.csv", mixed)
+
+    folded = quiet(fold_sales_chunks, path, 500)
+    assert folded is not None
+    dataset = SalesDataset(quiet(lambda: preprocess_data(load_sales_data(DATA_FILE))))
+    pd.testing.assert_frame_equal(quiet(calculate_revenue_by_period, folded, "D"),
+                                  quiet(calculate_revenue_by_period, dataset, "D"))
+    pd.testing.assert_frame_equal(quiet(get_top_n_products, folded, 10, "revenue"),
+                                  quiet(get_top_n_products, dataset, 10, "revenue"))
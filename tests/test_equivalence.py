@@ -0,0 +1,120 @@
+import contextlib
+import io
+import json
+import os
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+from urllib.parse import quote
+
+import pandas as pd
+import pytest
+
+import server
+from conftest import PROJECT_DIR
+from database import compute_sql_analysis, export_to_sqlite, open_database
+from process import SalesDataset, fold_sales_chunks, load_sales_data, preprocess_data
+from shards import compute_analysis, get_analysis_name
+
+
+# Каждый анализ, посчитанный двумя способами на Data 1.csv, должен давать одну и ту же таблицу:
+# по DataFrame и по SalesDataset (из памяти и заново), по агрегатам кусков и по всем строкам,
+# через HTTP-сервер и прямым вызовом, запросами к SQLite и в pandas.
+# Совпадение с исходной версией process.py проверяет test_golden.py
+
+DATA_FILE = os.path.join(PROJECT_DIR, "Data 1.csv")
+TOP_N = 10
+ANALYSES = [
+    ("revenue", "D"), ("revenue", "W"), ("revenue", "M"),
+    ("profit", "D"), ("profit", "W"), ("profit", "M"),
+    ("categories", None),
+    ("top", "quantity"), ("top", "revenue"),
+    ("inventory", None)
+]
+ANALYSIS_IDS = [get_analysis_name(name, option) for name, option in ANALYSES]
+
+
+def quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+@pytest.fixture(scope="module")
+def data_clean():
+    return quiet(lambda: preprocess_data(load_sales_data(DATA_FILE)))
+
+
+@pytest.fixture(scope="module")
+def dataset(data_clean):
+    return SalesDataset(data_clean)
+
+
+@pytest.mark.parametrize("name, option", ANALYSES, ids=ANALYSIS_IDS)
+def test_memoized_matches_uncached(data_clean, dataset, name, option):
+    # user-019 (запоминание результатов). DataFrame не запоминается, SalesDataset при втором вызове отдаёт результат из памяти
+    expected = quiet(compute_analysis, data_clean, name, option, TOP_N)
+    pd.testing.assert_frame_equal(quiet(compute_analysis, dataset, name, option, TOP_N), expected)
+    pd.testing.assert_frame_equal(quiet(compute_analysis, dataset, name, option, TOP_N), expected)
+
+
+@pytest.fixture(scope="module")
+def folded():
+    # Небольшие куски, чтобы агрегаты действительно сливались из многих частей
+    return quiet(fold_sales_chunks, DATA_FILE, 1000)
+
+
+@pytest.mark.parametrize("name, option", ANALYSES, ids=ANALYSIS_IDS)
+def test_fold_matches_in_memory(folded, dataset, name, option):
+    # user-017 (свёртка файла по кускам)
+    pd.testing.assert_frame_equal(quiet(compute_analysis, folded, name, option, TOP_N),
+                                  quiet(compute_analysis, dataset, name, option, TOP_N))
+
+
+@pytest.fixture(scope="module")
+def server_url(dataset):
+    server.AnalyticsHandler.datasets = {"data": dataset}
+    server.AnalyticsHandler.quiet = True
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.AnalyticsHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get_json(url, path):
+    with urllib.request.urlopen(url + quote(path, safe="/?=&")) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+@pytest.mark.parametrize("name, option", ANALYSES, ids=ANALYSIS_IDS)
+def test_server_matches_direct_call(server_url, data_clean, name, option):
+    # user-020 (HTTP-сервер): сервер отвечает теми же таблицами, что и прямой вызов функции анализа
+    paths = {
+        "revenue": f"/revenue?period={option}",
+        "profit": f"/profit?period={option}",
+        "categories": "/categories",
+        "top": f"/top?n={TOP_N}&metric={option}",
+        "inventory": f"/inventory?top_n={TOP_N}"
+    }
+    body = get_json(server_url, paths[name])
+    if name == "inventory":
+        body = body["table"]
+    expected = quiet(compute_analysis, SalesDataset(data_clean), name, option, TOP_N)
+    assert body == json.loads(json.dumps(server.table_to_json(expected), ensure_ascii=False))
+
+
+@pytest.fixture(scope="module")
+def connection(dataset, tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("sqlite") / "sales.db")
+    quiet(export_to_sqlite, dataset, db_path)
+    connection = open_database(db_path)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize("name, option", ANALYSES, ids=ANALYSIS_IDS)
+def test_sqlite_matches_pandas(connection, dataset, name, option):
+    # user-025 (анализы запросами к SQLite)
+    pd.testing.assert_frame_equal(quiet(compute_sql_analysis, connection, name, option, TOP_N),
+                                  quiet(compute_analysis, dataset, name, option, TOP_N))
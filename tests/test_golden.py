@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import PROJECT_DIR
+from process import (SalesDataset, load_sales_data, preprocess_data, calculate_revenue_by_period,
+                     calculate_profit_by_period, aggregate_sales_by_category, get_top_n_products,
+                     analyze_inventory_turnover)
+
+
+# Таблицы анализов на Data 1.csv должны совпадать с тем, что выдавала исходная версия process.py
+# (до оптимизаций); её результаты сохранены в tests/golden. Типы столбцов не сравниваются:
+# деньги теперь считаются в копейках и возвращаются в рублях как float, а не int.
+#
+# Кроме типов, единственное намеренное отличие — порядок товаров с равными суммами: исходная версия
+# оставляла его таким, какой получался при сортировке, теперь раньше идёт меньший артикул
+# или название товара (см. TIES).
+
+GOLDEN_DIR = os.path.join(PROJECT_DIR, "tests", "golden")
+
+ANALYSES = {
+    "revenue_D": lambda data: calculate_revenue_by_period(data, "D"),
+    "revenue_W": lambda data: calculate_revenue_by_period(data, "W"),
+    "revenue_M": lambda data: calculate_revenue_by_period(data, "M"),
+    "profit_D": lambda data: calculate_profit_by_period(data, "D"),
+    "profit_W": lambda data: calculate_profit_by_period(data, "W"),
+    "profit_M": lambda data: calculate_profit_by_period(data, "M"),
+    "categories": aggregate_sales_by_category,
+    "top_quantity_10": lambda data: get_top_n_products(data, 10, "quantity"),
+    "top_quantity_all": lambda data: get_top_n_products(data, 1000, "quantity"),
+    "top_quantity_2021-06-03": lambda data: get_top_n_products(data, 5, "quantity", "2021-06-03"),
+    "top_revenue_10": lambda data: get_top_n_products(data, 10, "revenue"),
+    "top_revenue_all": lambda data: get_top_n_products(data, 1000, "revenue"),
+    "top_revenue_2021-06-03": lambda data: get_top_n_products(data, 5, "revenue", "2021-06-03"),
+    "inventory_10": lambda data: analyze_inventory_turnover(data, 10),
+    "inventory_all": lambda data: analyze_inventory_turnover(data, 1000)
+}
+
+# Пары строк с равными суммами, которые теперь идут в обратном порядке: (позиции, столбец, значения в исходной версии).
+# Движение товаров при top_n >= 51: артикулы 46 и 33 (по 1386 проданных упаковок) поменялись местами,
+# поэтому при top_n = 51 в таблицу попадает артикул 33 вместо 46.
+# Полный топ по количеству: «Сахар рафинад быстрорастворимый» и «Мука хлебопекарная в\с» (по 1386 упаковок).
+TIES = {
+    "inventory_all": ((50, 51), "Артикул", (46, 33)),
+    "top_quantity_all": ((20, 21), "Название товара", ("Сахар рафинад быстрорастворимый", "Мука хлебопекарная в\\с"))
+}
+
+
+def quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def read_golden(name):
+    path = os.path.join(GOLDEN_DIR, f"{name}.csv")
+    if name == "categories":
+        return pd.read_csv(path, index_col=0)
+    table = pd.read_csv(path)
+    if "Дата" in table.columns:
+        table["Дата"] = pd.to_datetime(table["Дата"])
+    return table
+
+
+def apply_ties(name, expected):
+    # Меняет местами в исходной таблице строки с равными суммами, как их упорядочивает новая версия
+    if name not in TIES:
+        return expected
+    (first, second), column, values = TIES[name]
+    assert tuple(expected.loc[[first, second], column]) == values
+    order = list(expected.index)
+    order[first], order[second] = order[second], order[first]
+    return expected.loc[order].reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def data_clean():
+    return quiet(lambda: preprocess_data(load_sales_data(os.path.join(PROJECT_DIR, "Data 1.csv"))))
+
+
+@pytest.mark.parametrize("name", list(ANALYSES))
+@pytest.mark.parametrize("kind", ["DataFrame", "SalesDataset"])
+def test_matches_original_output(data_clean, name, kind):
+    data = data_clean if kind == "DataFrame" else SalesDataset(data_clean)
+    expected = apply_ties(name, read_golden(name))
+    pd.testing.assert_frame_equal(quiet(ANALYSES[name], data), expected, check_dtype=False)
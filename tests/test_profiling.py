@@ -0,0 +1,53 @@
+import atexit
+import contextlib
+import io
+import os
+
+import pytest
+
+import profiling
+from conftest import PROJECT_DIR
+from process import SalesDataset, calculate_revenue_by_period, load_sales_data, preprocess_data
+
+
+@pytest.fixture
+def profiling_enabled():
+    profiling.enable(memory=False)
+    yield
+    profiling.ENABLED = False
+    atexit.unregister(profiling.finish)
+
+
+def test_profiled_analysis_keeps_segments_lazy(profiling_enabled):
+    # Замеры считают строки SalesDataset без обращения к data, поэтому не сливают отложенные сегменты
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_clean = preprocess_data(load_sales_data(os.path.join(PROJECT_DIR, "Data 1.csv")))
+    last_day = data_clean['Дата'].max()
+    dataset = SalesDataset(data_clean[data_clean['Дата'] < last_day])
+    dataset.cube  # куб уже построен и дальше только дополняется
+    dataset.append(data_clean[data_clean['Дата'] == last_day])
+
+    revenue = calculate_revenue_by_period(dataset, "W")
+    assert len(revenue) > 0
+    assert dataset._segments
+
+    stages = {item["stage"]: item for item in profiling.get_summary()}
+    assert stages["calculate_revenue_by_period"]["rows_in"] == len(data_clean)
+
+
+def test_profiling_memory_does_not_grow_with_calls(profiling_enabled, monkeypatch):
+    # Итоги копятся по этапам, а событий трассы хранится не больше MAX_TRACE_EVENTS
+    monkeypatch.setattr(profiling, "TRACE_PATH", "unused.json")
+    monkeypatch.setattr(profiling, "MAX_TRACE_EVENTS", 5)
+    monkeypatch.setattr(profiling, "_trace", [])
+    monkeypatch.setattr(profiling, "_summary", {})
+    monkeypatch.setattr(profiling, "_dropped_events", 0)
+
+    for _ in range(20):
+        with profiling.stage("repeated"):
+            pass
+
+    [item] = profiling.get_summary()
+    assert (item["stage"], item["calls"]) == ("repeated", 20)
+    assert len(profiling._trace) == 5
+    assert profiling._dropped_events == 15
@@ -0,0 +1,16 @@
+import contextlib
+import io
+import os
+
+from conftest import PROJECT_DIR
+from report import main
+
+
+def test_invalid_date_is_rejected(tmp_path):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = main([os.path.join(PROJECT_DIR, "Data 1.csv"), "-a", "top:revenue", "-d", "abc",
+                       "-o", str(tmp_path / "report")])
+    assert status == 1
+    assert "ГГГГ-ММ-ДД" in output.getvalue()
+    assert not os.path.exists(tmp_path / "report")
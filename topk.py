@@ -0,0 +1,98 @@
+import numpy as np
+
+
+# Выбор k наибольших (наименьших) значений без полной сортировки.
+# Все функции возвращают позиции строк, а не сами значения, поэтому ими удобно
+# выбирать строки из сгруппированной таблицы через iloc.
+# При равенстве значений раньше всегда идёт строка с меньшей позицией,
+# так же как в DataFrame.nlargest / nsmallest (keep='first').
+
+
+def get_valid_positions(values):
+    # Позиции значений без пропусков (NaN)
+    if np.issubdtype(values.dtype, np.floating):
+        return np.flatnonzero(~np.isnan(values))
+    return np.arange(len(values))
+
+
+def order_all(values, positions, k, ascending):
+    # k больше числа значений без пропусков: сортируем их все, а пропуски,
+    # как и в nlargest / nsmallest, добавляем в конец в порядке позиций
+    ordered = order_candidates(values, positions, ascending)
+    missing = np.setdiff1d(np.arange(len(values)), positions)
+    return np.concatenate([ordered, missing])[:k]
+
+
+def order_candidates(values, candidates, ascending):
+    # Сортируем только кандидатов: по значению, при равенстве — по позиции
+    keys = values[candidates] if ascending else -values[candidates]
+    return candidates[np.lexsort((candidates, keys))]
+
+
+def pick_candidates(values, positions, kth, k, ascending):
+    # Все значения строго лучше k-го плюс столько равных ему, сколько осталось до k
+    # (равные берутся в порядке позиций)
+    if ascending:
+        better = positions[values[positions] < kth]
+    else:
+        better = positions[values[positions] > kth]
+    equal = positions[values[positions] == kth][:k - len(better)]
+    return np.concatenate([better, equal])
+
+
+def select_top_positions(values, k, ascending=False):
+    # Позиции k наибольших (при ascending=True — наименьших) значений в порядке убывания (возрастания).
+    # np.partition находит k-е значение за O(n), сортируются только k выбранных позиций.
+    values = np.asarray(values)
+    positions = get_valid_positions(values)
+    if k <= 0 or len(values) == 0:
+        return np.array([], dtype=np.intp)
+    if k >= len(positions):
+        return order_all(values, positions, k, ascending)
+
+    index = k - 1 if ascending else len(positions) - k
+    kth = np.partition(values[positions], index)[index]
+    return order_candidates(values, pick_candidates(values, positions, kth, k, ascending), ascending)
+
+
+def select_top_bottom_positions(values, k):
+    # Позиции k наибольших и k наименьших значений за один вызов np.partition
+    values = np.asarray(values)
+    positions = get_valid_positions(values)
+    if k <= 0 or len(values) == 0:
+        empty = np.array([], dtype=np.intp)
+        return empty, empty
+    if k >= len(positions):
+        return order_all(values, positions, k, False), order_all(values, positions, k, True)
+
+    valid = values[positions]
+    partitioned = np.partition(valid, [k - 1, len(valid) - k])
+    top = pick_candidates(values, positions, partitioned[len(valid) - k], k, ascending=False)
+    bottom = pick_candidates(values, positions, partitioned[k - 1], k, ascending=True)
+    return order_candidates(values, top, False), order_candidates(values, bottom, True)
+
+
+def select_top_per_group(groups, values, k, ascending=False):
+    # Позиции k лучших значений внутри каждой группы (groups — целые коды групп), пропуски не берутся.
+    # Без цикла по группам: одна сортировка по (группа, значение, позиция),
+    # затем номер строки внутри группы считается через начало группы.
+    groups = np.asarray(groups)
+    values = np.asarray(values)
+    positions = get_valid_positions(values)
+    if k <= 0 or len(positions) == 0:
+        return np.array([], dtype=np.intp)
+
+    keys = values[positions] if ascending else -values[positions]
+    order = positions[np.lexsort((positions, keys, groups[positions]))]
+
+    return order[get_group_ranks(groups[order]) < k]
+
+
+def get_group_ranks(sorted_groups):
+    # Место каждой строки внутри своей группы (0, 1, 2, ...) для массива, где группы идут подряд
+    if len(sorted_groups) == 0:
+        return np.array([], dtype=np.intp)
+    is_start = np.concatenate([[True], sorted_groups[1:] != sorted_groups[:-1]])
+    starts = np.flatnonzero(is_start)
+    group_start = np.repeat(starts, np.diff(np.concatenate([starts, [len(sorted_groups)]])))
+    return np.arange(len(sorted_groups)) - group_start